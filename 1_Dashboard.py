@@ -7,6 +7,10 @@ import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from io import BytesIO
+from data_utils import load_dataset, compact_frame, build_cube, cube_totals
+from filter_utils import FilterIndex
+from chart_utils import prepare_chart
+from db import log_event
 
 # ----------------------------
 # Page Configuration
@@ -23,22 +27,32 @@ st.sidebar.header("⚙️ Dashboard Settings")
 uploaded_file = st.sidebar.file_uploader("📤 Upload your sales dataset (CSV or Excel)", type=["csv", "xlsx"])
 
 if uploaded_file:
-    # Load dataset
-    if uploaded_file.name.endswith(".csv"):
-        df = pd.read_csv(uploaded_file)
-    else:
-        df = pd.read_excel(uploaded_file)
-
-    st.session_state["df"] = df
+    # Load dataset (parsed once per upload, then served from the on-disk cache; rows are kept as uploaded)
+    if st.session_state.get("df_file_id") != uploaded_file.file_id:
+        progress = st.progress(0.0, text="⏳ Loading dataset...")
+        df, df_key = load_dataset(uploaded_file, clean=False, on_progress=lambda p: progress.progress(p, text="⏳ Loading dataset..."))
+        progress.empty()
+        df, st.session_state["df_memory"] = compact_frame(df)
+        st.session_state["df"] = df
+        st.session_state["df_cube"] = build_cube(df, df.select_dtypes(include="number").columns)
+        st.session_state["df_index"] = FilterIndex(df)
+        st.session_state["df_key"] = df_key
+        st.session_state["df_file_id"] = uploaded_file.file_id
+        log_event("upload", (st.session_state.get("current_user") or {}).get("email"), page="dashboard",
+                  file=uploaded_file.name, rows=len(df), columns=len(df.columns), dataset_key=df_key)
+
+    df = st.session_state["df"]
 
     # ----------------------------
     # Data Overview
     # ----------------------------
     st.subheader("📋 Dataset Overview")
     st.dataframe(df.head(), use_container_width=True)
+    mem = st.session_state["df_memory"]
+    st.caption(f"🗜️ In-memory size: {mem['bytes_before'] / 1e6:,.1f} MB → {mem['bytes_after'] / 1e6:,.1f} MB after compaction")
 
-    numeric_cols = df.select_dtypes(include=["int64", "float64"]).columns.tolist()
-    text_cols = df.select_dtypes(include=["object"]).columns.tolist()
+    numeric_cols = df.select_dtypes(include="number").columns.tolist()
+    text_cols = df.select_dtypes(include=["object", "category"]).columns.tolist()
 
     st.markdown("---")
 
@@ -47,12 +61,13 @@ if uploaded_file:
     # ----------------------------
     st.subheader("📊 Key Performance Indicators")
 
+    cube = st.session_state["df_cube"]
     col1, col2, col3 = st.columns(3)
     col1.metric("📦 Total Records", len(df))
     if len(numeric_cols) >= 1:
-        col2.metric(f"💰 Total {numeric_cols[0]}", f"{df[numeric_cols[0]].sum():,.2f}")
+        col2.metric(f"💰 Total {numeric_cols[0]}", f"{cube_totals(cube, numeric_cols[0])['sum']:,.2f}")
     if len(numeric_cols) >= 2:
-        col3.metric(f"📈 Total {numeric_cols[1]}", f"{df[numeric_cols[1]].sum():,.2f}")
+        col3.metric(f"📈 Total {numeric_cols[1]}", f"{cube_totals(cube, numeric_cols[1])['sum']:,.2f}")
 
     st.markdown("---")
 
@@ -60,13 +75,33 @@ if uploaded_file:
     # Filters
     # ----------------------------
     st.sidebar.header("🔍 Filters")
-    filter_col = st.sidebar.selectbox("Select column to filter (optional)", text_cols)
-    unique_vals = df[filter_col].unique() if filter_col else []
-    selected_val = st.sidebar.selectbox(f"Filter {filter_col} by:", unique_vals) if filter_col else None
-
-    if selected_val:
-        df = df[df[filter_col] == selected_val]
-        st.success(f"✅ Filter applied: {filter_col} = {selected_val}")
+    index = st.session_state["df_index"]
+    conditions = []
+    for filter_col in st.sidebar.multiselect("Select columns to filter (optional)", text_cols):
+        selected_vals = st.sidebar.multiselect(f"Filter {filter_col} by:", index.categories(filter_col))
+        if selected_vals:
+            conditions.append((filter_col, "in", selected_vals))
+
+    date_cols = df.select_dtypes(include="datetime").columns.tolist()
+    date_col = st.sidebar.selectbox("Date range on (optional)", [None] + date_cols, format_func=lambda c: "—" if c is None else c)
+    if date_col:
+        lo, hi = index.bounds(date_col)
+        picked = st.sidebar.date_input(f"{date_col} between:", (pd.Timestamp(lo).date(), pd.Timestamp(hi).date()))
+        if len(picked) == 2:
+            end = pd.Timestamp(picked[1]) + pd.Timedelta(days=1) - pd.Timedelta(1, "ns")
+            conditions.append((date_col, "between", (picked[0], end)))
+
+    range_col = st.sidebar.selectbox("Numeric range on (optional)", [None] + numeric_cols, format_func=lambda c: "—" if c is None else c)
+    if range_col:
+        lo, hi = index.bounds(range_col)
+        if lo is not None and lo < hi:
+            picked = st.sidebar.slider(f"{range_col} between:", float(lo), float(hi), (float(lo), float(hi)))
+            conditions.append((range_col, "between", picked))
+
+    combine = st.sidebar.radio("Combine filters with", ["AND", "OR"], horizontal=True)
+    if conditions:
+        df = df.iloc[index.query(conditions, combine.lower())]
+        st.success(f"✅ {len(conditions)} filter(s) applied ({combine}): {len(df):,} matching rows")
 
     # ----------------------------
     # Chart Selection
@@ -81,17 +116,20 @@ if uploaded_file:
     x_axis = st.selectbox("Select X-axis", df.columns, index=0)
     y_axis = st.selectbox("Select Y-axis", numeric_cols, index=0)
 
+    plot_df, sampling = prepare_chart(df, chart_type, x_axis, y_axis)
+
     fig = None
     if chart_type == "Line Chart":
-        fig = px.line(df, x=x_axis, y=y_axis, markers=True, title=f"{y_axis} over {x_axis}")
+        fig = px.line(plot_df, x=x_axis, y=y_axis, markers=True, title=f"{y_axis} over {x_axis}")
     elif chart_type == "Bar Chart":
-        fig = px.bar(df, x=x_axis, y=y_axis, color=x_axis, title=f"{y_axis} by {x_axis}")
+        fig = px.bar(plot_df, x=x_axis, y=sampling["y"], color=x_axis, title=f"{y_axis} by {x_axis}")
     elif chart_type == "Area Chart":
-        fig = px.area(df, x=x_axis, y=y_axis, title=f"{y_axis} Trend (Area)")
+        fig = px.area(plot_df, x=x_axis, y=y_axis, title=f"{y_axis} Trend (Area)")
     elif chart_type == "Donut Chart":
-        fig = px.pie(df, names=x_axis, values=y_axis, hole=0.5, title="Category Distribution")
+        fig = px.pie(plot_df, names=x_axis, values=sampling["y"], hole=0.5, title="Category Distribution")
     elif chart_type == "Scatter Plot":
-        fig = px.scatter(df, x=x_axis, y=y_axis, color=x_axis, size=y_axis, title=f"{y_axis} vs {x_axis}")
+        fig = px.scatter(plot_df, x=x_axis, y=y_axis, color=x_axis, size=y_axis, render_mode=sampling["render_mode"],
+                         title=f"{y_axis} vs {x_axis}")
     elif chart_type == "Gauge Chart":
         fig = go.Figure(go.Indicator(
             mode="gauge+number",
@@ -102,5 +140,8 @@ if uploaded_file:
 
     if fig:
         st.plotly_chart(fig, use_container_width=True)
+        if sampling["factor"] > 1:
+            st.caption(f"⚡ Plotted {sampling['points']:,} of {sampling['rows']:,} rows "
+                       f"({sampling['method']}, {sampling['factor']:,.0f}× smaller payload)")
 else:
     st.info("📂 Please upload your dataset using the sidebar to begin.")
@@ -1,8 +1,12 @@
 import streamlit as st
 from datetime import datetime
+from auth import require_role
+from login_service import LOGIN_SERVICE
+from db import init_db, list_users_page, list_feedback_page
 
 # ✅ Page Setup
 st.set_page_config(page_title="Admin Panel", page_icon="🛠️", layout="wide")
+require_role("admin")
 
 # 🎨 Custom Styling
 st.markdown("""
@@ -38,6 +42,49 @@ with col3:
     st.metric("Reports Downloaded", "57", "+9 today")
 st.markdown("</div>", unsafe_allow_html=True)
 
+# 🔐 Login Latency
+st.markdown("<div class='section'>", unsafe_allow_html=True)
+st.subheader("🔐 Login Verification Latency")
+latency = LOGIN_SERVICE.latency_percentiles()
+for col, (name, ms) in zip(st.columns(len(latency)), latency.items()):
+    with col:
+        st.metric(name, "—" if ms is None else f"{ms:.0f} ms")
+st.markdown("</div>", unsafe_allow_html=True)
+
+# 👥 Users & Feedback (keyset-paginated, one page per rerun)
+PAGE_SIZE = 50
+
+def paged_table(key, fetch):
+    # cursors of the pages seen so far, so "Previous" can step back without offsets
+    cursors = st.session_state.setdefault(f"{key}_cursors", [None])
+    rows, next_cursor = fetch(PAGE_SIZE, cursors[-1])
+    st.dataframe(rows, use_container_width=True, hide_index=True)
+    prev_col, info_col, next_col = st.columns([1, 2, 1])
+    with prev_col:
+        if st.button("◀ Previous", key=f"{key}_prev", disabled=len(cursors) == 1):
+            cursors.pop()
+            st.rerun()
+    with info_col:
+        st.caption(f"Page {len(cursors)}")
+    with next_col:
+        if st.button("Next ▶", key=f"{key}_next", disabled=next_cursor is None):
+            cursors.append(next_cursor)
+            st.rerun()
+
+init_db()
+st.markdown("<div class='section'>", unsafe_allow_html=True)
+st.subheader("👥 Users & Feedback")
+users_tab, feedback_tab = st.tabs(["Users", "Feedback"])
+with users_tab:
+    paged_table("admin_users", list_users_page)
+with feedback_tab:
+    feedback_user = st.text_input("Filter by user email", key="admin_feedback_user").strip()
+    if st.session_state.get("admin_feedback_filter") != feedback_user:
+        st.session_state["admin_feedback_filter"] = feedback_user
+        st.session_state["admin_feedback_cursors"] = [None]
+    paged_table("admin_feedback", lambda limit, after: list_feedback_page(limit, after, feedback_user or None))
+st.markdown("</div>", unsafe_allow_html=True)
+
 # 🧭 Navigation Tiles
 st.markdown("<div class='section'>", unsafe_allow_html=True)
 st.subheader("🧩 Admin Functional Areas")
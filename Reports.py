@@ -5,12 +5,8 @@ import streamlit as st
 import pandas as pd
 import matplotlib.pyplot as plt
 import plotly.express as px
-from io import BytesIO
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
-from reportlab.lib.utils import ImageReader
-from datetime import datetime
-import tempfile
+from report_jobs import submit_report, job_status
+from chart_utils import prepare_chart
 
 # ----------------------------
 # Page Configuration
@@ -34,8 +30,8 @@ df = st.session_state["df"]
 st.subheader("📋 Dataset Preview")
 st.dataframe(df.head(), use_container_width=True)
 
-numeric_cols = df.select_dtypes(include=["int64", "float64"]).columns
-text_cols = df.select_dtypes(include=["object"]).columns
+numeric_cols = df.select_dtypes(include="number").columns
+text_cols = df.select_dtypes(include=["object", "category"]).columns
 
 if numeric_cols.empty:
     st.error("❌ No numeric data found for visualization or report generation.")
@@ -52,18 +48,24 @@ y_axis = st.selectbox("Select Y-axis", numeric_cols, index=0)
 # ----------------------------
 # Generate Chart
 # ----------------------------
+plot_df, sampling = prepare_chart(df, chart_type, x_axis, y_axis)
+
 fig = None
 if chart_type == "Bar Chart":
-    fig = px.bar(df, x=x_axis, y=y_axis, color=x_axis, title=f"{y_axis} by {x_axis}")
+    fig = px.bar(plot_df, x=x_axis, y=sampling["y"], color=x_axis, title=f"{y_axis} by {x_axis}")
 elif chart_type == "Line Chart":
-    fig = px.line(df, x=x_axis, y=y_axis, markers=True, title=f"{y_axis} Trend over {x_axis}")
+    fig = px.line(plot_df, x=x_axis, y=y_axis, markers=True, title=f"{y_axis} Trend over {x_axis}")
 elif chart_type == "Scatter Plot":
-    fig = px.scatter(df, x=x_axis, y=y_axis, color=x_axis, size=y_axis, title=f"{y_axis} vs {x_axis}")
+    fig = px.scatter(plot_df, x=x_axis, y=y_axis, color=x_axis, size=y_axis, render_mode=sampling["render_mode"],
+                     title=f"{y_axis} vs {x_axis}")
 elif chart_type == "Donut Chart":
-    fig = px.pie(df, names=x_axis, values=y_axis, hole=0.5, title=f"{y_axis} Distribution by {x_axis}")
+    fig = px.pie(plot_df, names=x_axis, values=sampling["y"], hole=0.5, title=f"{y_axis} Distribution by {x_axis}")
 
 if fig:
     st.plotly_chart(fig, use_container_width=True)
+    if sampling["factor"] > 1:
+        st.caption(f"⚡ Plotted {sampling['points']:,} of {sampling['rows']:,} rows "
+                   f"({sampling['method']}, {sampling['factor']:,.0f}× smaller payload)")
 
 # ----------------------------
 # PDF Report Generator
@@ -75,74 +77,43 @@ report_title = "MSME Business Intelligence Report"
 author_name = "Developed by Small Enterprises"
 
 if st.button("📥 Generate & Download PDF"):
-    with tempfile.TemporaryDirectory() as tmpdirname:
-        # Save chart as image
-        chart_path = f"{tmpdirname}/chart.png"
-        fig.write_image(chart_path, format="png")
-
-        # Create PDF buffer
-        buffer = BytesIO()
-        pdf = canvas.Canvas(buffer, pagesize=A4)
-        width, height = A4
-
-        # Header
-        pdf.setFont("Helvetica-Bold", 16)
-        pdf.drawString(50, height - 60, report_title)
-        pdf.setFont("Helvetica", 10)
-        pdf.drawString(50, height - 80, f"Generated on: {datetime.now().strftime('%d %B %Y, %I:%M %p')}")
-        pdf.drawString(50, height - 95, author_name)
-
-        # Add chart
-        img = ImageReader(chart_path)
-        pdf.drawImage(img, 50, height - 450, width=500, height=300, preserveAspectRatio=True)
-
-        # Add Summary Statistics
-        pdf.setFont("Helvetica-Bold", 12)
-        pdf.drawString(50, height - 480, "📊 Summary Statistics:")
-        pdf.setFont("Helvetica", 9)
-
-        summary = df[numeric_cols].describe().round(2).to_string()
-        y_pos = height - 495
-        for line in summary.split("\n"):
-            if y_pos < 80:
-                pdf.showPage()
-                y_pos = height - 60
-            pdf.drawString(50, y_pos, line)
-            y_pos -= 12
-
-        # Add Insights
-        y_pos -= 25
-        pdf.setFont("Helvetica-Bold", 12)
-        pdf.drawString(50, y_pos, "💡 Key Insights:")
-        y_pos -= 15
-        pdf.setFont("Helvetica", 9)
-
-        for col in numeric_cols:
-            avg = df[col].mean()
-            maxv = df[col].max()
-            minv = df[col].min()
-            line = f"- {col}: Avg = {avg:.2f}, Max = {maxv:.2f}, Min = {minv:.2f}"
-            if y_pos < 80:
-                pdf.showPage()
-                y_pos = height - 60
-            pdf.drawString(50, y_pos, line)
-            y_pos -= 12
-
-        # Footer
-        pdf.setFont("Helvetica-Oblique", 9)
-        pdf.drawString(50, 40, "Generated by MSME BI Dashboard | © 2025 Prince Arockyam")
-
-        pdf.showPage()
-        pdf.save()
-
-        # Download Button
-        st.download_button(
-            label="📄 Download MSME Report (PDF)",
-            data=buffer.getvalue(),
-            file_name="MSME_BI_Report.pdf",
-            mime="application/pdf"
-        )
-
+    user = st.session_state.get("current_user") or {}
+    st.session_state["report_job"] = submit_report(
+        df, fig,
+        {"numeric_cols": numeric_cols, "title": report_title, "author": author_name,
+         "chart_type": chart_type, "x_axis": x_axis, "y_axis": y_axis},
+        owner_email=user.get("email"), dataset_key=st.session_state.get("df_key"))
+    st.session_state.pop("report_result", None)
+
+@st.fragment(run_every=1.0)
+def report_job_progress():
+    # only rendered while a job is pending; once it ends the result is kept and polling stops
+    job = job_status(st.session_state["report_job"])
+    if job is not None and job["status"] in ("queued", "running"):
+        st.progress(job["progress"] or 0.0, text=f"⏳ Report {job['status']}...")
+        return
+    if job is not None and job["status"] == "done":
+        try:
+            with open(job["result_path"], "rb") as f:
+                st.session_state["report_result"] = {"pdf": f.read()}
+        except FileNotFoundError:
+            st.session_state["report_result"] = {"error": "the report file has expired, please generate it again"}
+    else:
+        st.session_state["report_result"] = {"error": job["error"] if job else "the job was not found"}
+    st.rerun()
+
+result = st.session_state.get("report_result")
+if result and "pdf" in result:
+    st.download_button(
+        label="📄 Download MSME Report (PDF)",
+        data=result["pdf"],
+        file_name="MSME_BI_Report.pdf",
+        mime="application/pdf"
+    )
     st.success("✅ Your report has been generated successfully!")
+elif result:
+    st.error(f"❌ Report generation failed: {result['error']}")
+elif st.session_state.get("report_job"):
+    report_job_progress()
 
 st.info("Tip: Choose your chart type above, then click **Generate PDF** to get a complete report with visuals and insights.")
@@ -1,20 +1,23 @@
 import streamlit as st
 import pandas as pd
 import io
+from data_utils import load_dataset, compact_frame, build_cube, cube_rollup
+from db import log_event
 
 # Set page configuration
 st.set_page_config(layout="wide", page_title="AI Sales Suggestions")
 
-def get_ai_suggestions(df):
+def get_ai_suggestions(cube):
     """
     Analyzes the sales data and generates suggestions to improve sales and profit.
-    This function now assumes column names have been standardized before it is called.
+    Works from the aggregate cube (TotalPrice by Product and OrderDate month) built once per upload,
+    so it never touches the row-level data.
     """
     suggestions = []
 
     try:
         # --- 1. Identify Top and Bottom Performing Products ---
-        product_sales = df.groupby('Product')['TotalPrice'].sum().sort_values(ascending=False)
+        product_sales = cube_rollup(cube, 'Product', 'TotalPrice', 'sum').sort_values(ascending=False)
         
         if product_sales.empty:
             st.warning("Could not find product sales data to analyze.")
@@ -37,8 +40,7 @@ def get_ai_suggestions(df):
         })
 
         # --- 2. Analyze Sales Trends Over Time ---
-        df['Month'] = df['OrderDate'].dt.to_period('M')
-        monthly_sales = df.groupby('Month')['TotalPrice'].sum()
+        monthly_sales = cube_rollup(cube, 'period', 'TotalPrice', 'sum')
         
         if len(monthly_sales) > 1:
             last_month_sales = monthly_sales.iloc[-1]
@@ -86,11 +88,13 @@ uploaded_file = st.file_uploader("Choose a CSV or Excel file", type=["csv", "xls
 
 if uploaded_file is not None:
     try:
-        # Read the file into a pandas dataframe
-        if uploaded_file.name.endswith('.csv'):
-            df = pd.read_csv(uploaded_file)
-        else:
-            df = pd.read_excel(uploaded_file)
+        # Read the file into a pandas dataframe (parsed once per upload, then served from the on-disk cache)
+        if st.session_state.get("ai_df_file_id") != uploaded_file.file_id:
+            st.session_state["ai_df"], _ = compact_frame(load_dataset(uploaded_file, clean=False)[0])
+            st.session_state["ai_df_file_id"] = uploaded_file.file_id
+            log_event("upload", (st.session_state.get("current_user") or {}).get("email"), page="ai_predictive",
+                      file=uploaded_file.name, rows=len(st.session_state["ai_df"]))
+        df = st.session_state["ai_df"]
 
         # --- FIX: Standardize column names ---
         # This block checks for common variations and renames them
@@ -101,7 +105,7 @@ if uploaded_file is not None:
             'Total Sale': 'TotalPrice',
             'Date': 'OrderDate'
         }
-        df.rename(columns={k: v for k, v in rename_map.items() if k in df.columns}, inplace=True)
+        df = df.rename(columns={k: v for k, v in rename_map.items() if k in df.columns})
         
         # --- Data Validation ---
         required_columns = ['OrderDate', 'Product', 'TotalPrice']
@@ -113,13 +117,18 @@ if uploaded_file is not None:
         else:
             # Convert date column safely
             df['OrderDate'] = pd.to_datetime(df['OrderDate'])
+
+            # Aggregate once per upload; suggestions are answered from the cube
+            if st.session_state.get("ai_cube_file_id") != uploaded_file.file_id:
+                st.session_state["ai_cube"] = build_cube(df, ['TotalPrice'], ['Product'], 'OrderDate')
+                st.session_state["ai_cube_file_id"] = uploaded_file.file_id
             
             st.success("File uploaded successfully! Here's a preview of your data with standardized columns:")
             st.dataframe(df.head())
 
             if st.button("Generate AI Suggestions", type="primary"):
                 with st.spinner("🧠 AI is analyzing your data..."):
-                    suggestions = get_ai_suggestions(df.copy()) # Pass a copy to be safe
+                    suggestions = get_ai_suggestions(st.session_state["ai_cube"])
 
                 if suggestions:
                     st.subheader("Here are your personalized suggestions:")
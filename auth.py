@@ -1,10 +1,44 @@
+import json
 import streamlit as st
-from db import verify_user
+import streamlit.components.v1 as components
+from login_service import LOGIN_SERVICE
+from session_tokens import SESSIONS, SESSION_TTL
 
 SESSION_KEY = "current_user"
+TOKEN_KEY = "session_token"
+COOKIE_NAME = "dd_session"
+_COOKIE_PENDING = "_session_cookie_pending"
+_COOKIE_STALE = "_session_cookie_stale"
+
+def _write_cookie(token, max_age):
+    # Streamlit cannot set response cookies, so the browser sets it; a script cannot mark it HttpOnly
+    cookie = json.dumps(f"{COOKIE_NAME}={token}; Path=/; Max-Age={max_age}; SameSite=Strict")
+    components.html(f"<script>parent.document.cookie = {cookie} + "
+                    f"(parent.location.protocol === 'https:' ? '; Secure' : '');</script>", height=0)
+
+def _restore_session():
+    # the token lives in a cookie (never the URL) so a refresh or new tab resumes the session without a password check
+    token = st.session_state.get(TOKEN_KEY)
+    if not token:
+        cookie = st.context.cookies.get(COOKIE_NAME)
+        # st.context.cookies is fixed for the whole connection, so skip a cookie already found dead
+        token = cookie if cookie != st.session_state.get(_COOKIE_STALE) else None
+    user = SESSIONS.validate(token) if token else None
+    if user is None:
+        st.session_state.pop(SESSION_KEY, None)
+        st.session_state.pop(TOKEN_KEY, None)
+        if token:
+            st.session_state[_COOKIE_STALE] = token
+            st.session_state[_COOKIE_PENDING] = ""
+    else:
+        st.session_state[SESSION_KEY], st.session_state[TOKEN_KEY] = user, token
+    pending = st.session_state.pop(_COOKIE_PENDING, None)
+    if pending is not None:
+        _write_cookie(pending, SESSION_TTL if pending else 0)
+    return user
 
 def is_logged_in():
-    return SESSION_KEY in st.session_state and st.session_state[SESSION_KEY] is not None
+    return _restore_session() is not None
 
 def get_current_user():
     return st.session_state.get(SESSION_KEY)
@@ -16,17 +50,25 @@ def login_form():
         password = st.text_input("Password", type="password")
         submitted = st.form_submit_button("Log in")
     if submitted:
-        u = verify_user(email, password)
+        with st.spinner("Signing in..."):
+            u, error = LOGIN_SERVICE.verify(email, password, ip=getattr(st.context, "ip_address", None))
         if u:
             st.session_state[SESSION_KEY] = {"email": u["email"], "name": u["name"], "role": u["role"]}
+            # the cookie is written on the next run; st.rerun() would drop an element emitted now
+            st.session_state[TOKEN_KEY] = st.session_state[_COOKIE_PENDING] = SESSIONS.issue(u)
             st.success(f"Welcome, {u['name']}!")
             st.rerun()   # ✅ updated from experimental_rerun()
         else:
-            st.error("Invalid credentials")
+            st.error(error)
     return is_logged_in()
 
 def logout_button():
     if st.sidebar.button("🚪 Log out"):
+        token = st.session_state.pop(TOKEN_KEY, None)
+        if token:
+            SESSIONS.revoke(token)
+            st.session_state[_COOKIE_STALE] = token
+        st.session_state[_COOKIE_PENDING] = ""
         st.session_state.pop(SESSION_KEY, None)
         st.rerun()
 
@@ -0,0 +1,85 @@
+import numpy as np, pandas as pd
+
+POINT_BUDGET = 5_000
+WEBGL_ABOVE = 1_000
+
+def lttb(x, y, n):
+    """Largest-Triangle-Three-Buckets: positions of `n` points of (x, y) that keep the visual shape of the line."""
+    size = len(x)
+    if n >= size or n < 3:
+        return np.arange(size)
+    x, y = np.asarray(x, dtype="float64"), np.asarray(y, dtype="float64")
+    edges = np.linspace(1, size - 1, n - 1).astype(np.int64)
+    keep = np.empty(n, dtype=np.int64)
+    keep[0], keep[-1] = 0, size - 1
+    a = 0
+    for i in range(n - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nxt_lo, nxt_hi = hi, (edges[i + 2] if i + 2 < len(edges) else size)
+        cx, cy = x[nxt_lo:nxt_hi].mean(), y[nxt_lo:nxt_hi].mean()
+        area = np.abs((x[a] - cx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (cy - y[a]))
+        a = lo + int(np.argmax(area)) if len(area) else lo
+        keep[i + 1] = a
+    return keep
+
+def _axis_values(s):
+    if pd.api.types.is_datetime64_any_dtype(s):
+        return s.to_numpy(dtype="datetime64[ns]").astype("int64").astype("float64")
+    return s.to_numpy(dtype="float64")
+
+def _is_continuous(s):
+    return (pd.api.types.is_numeric_dtype(s) and not pd.api.types.is_bool_dtype(s)) or pd.api.types.is_datetime64_any_dtype(s)
+
+def _measure(x, y):
+    # a column plotted against itself is totalled into its own column, so the frame keeps both axes
+    return f"{y} total" if x == y else y
+
+def _group_totals(df, x, y, budget):
+    measure = _measure(x, y)
+    totals = df.groupby(x, observed=True, sort=False)[y].sum().rename(measure).reset_index()
+    if len(totals) > budget:
+        totals = totals.sort_values(measure, ascending=False)
+        rest = totals.iloc[budget - 1:][measure].sum()
+        totals = totals.iloc[:budget - 1].astype({x: object})
+        totals = pd.concat([totals, pd.DataFrame({x: ["Other"], measure: [rest]})], ignore_index=True)
+    return totals
+
+def _density_sample(df, x, y, budget):
+    # one representative row per occupied cell of a bins x bins grid, in the original row order
+    bins = max(2, int(np.sqrt(budget)))
+    xs = pd.Series(_axis_values(df[x]) if _is_continuous(df[x]) else pd.factorize(df[x])[0].astype("float64"))
+    ys = pd.Series(_axis_values(df[y]))
+    cells = pd.DataFrame({"bx": pd.cut(xs, bins, labels=False) if xs.nunique() > bins else xs,
+                          "by": pd.cut(ys, bins, labels=False)})
+    return np.sort(cells.drop_duplicates().index.to_numpy())
+
+def prepare_chart(df, chart_type, x, y, budget=POINT_BUDGET):
+    """
+    Reduce `df` to at most about `budget` plotted points for `chart_type` before it is handed to Plotly.
+    Line/area: LTTB over rows sorted by x (group totals when x is categorical), only past the budget.
+    Scatter: WebGL rendering, and one representative row per occupied density cell past the budget.
+    Bar/donut: one total per category (top categories plus "Other" past the budget).
+    Returns (frame, info) where info has rows, points, method, factor, render_mode and y, the column
+    to plot as the measure (y itself, or "<y> total" when a column is totalled against itself).
+    """
+    rows, method, render_mode = len(df), "none", "auto"
+    measure = y
+    if chart_type in ("Line Chart", "Area Chart"):
+        if not _is_continuous(df[x]) and len(df) > budget:
+            df, method, measure = _group_totals(df, x, y, budget), "group totals", _measure(x, y)
+        if len(df) > budget:
+            if not df[x].is_monotonic_increasing:
+                df = df.sort_values(x, kind="stable")
+            xs = _axis_values(df[x]) if _is_continuous(df[x]) else np.arange(len(df), dtype="float64")
+            df = df.iloc[lttb(xs, _axis_values(df[measure]), budget)]
+            method = "LTTB"
+    elif chart_type == "Scatter Plot":
+        if len(df) > WEBGL_ABOVE:
+            render_mode = "webgl"
+        if len(df) > budget:
+            df, method = df.iloc[_density_sample(df, x, y, budget)], "density binning"
+    elif chart_type in ("Bar Chart", "Donut Chart"):
+        df, method, measure = _group_totals(df, x, y, budget), "group totals", _measure(x, y)
+    points = len(df)
+    return df, {"rows": rows, "points": points, "method": method, "render_mode": render_mode,
+                "factor": rows / points if points else 1.0, "y": measure}
@@ -1,32 +1,611 @@
+import os
+import hashlib
+import uuid
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 import numpy as np
 
+CHUNK_ROWS = 100_000
+ETL_WORKERS = min(8, os.cpu_count() or 1)
+CACHE_DIR = os.path.join(os.path.dirname(__file__), ".data_cache")
+CACHE_MAX_BYTES = 4 * 1024 ** 3
+
+def _is_excel(name):
+    return str(name).lower().endswith((".xlsx", ".xls"))
+
 def read_any(file):
-    name = getattr(file, "name", "uploaded")
-    if str(name).lower().endswith((".xlsx", ".xls")):
+    name = getattr(file, "name", file if isinstance(file, (str, os.PathLike)) else "uploaded")
+    if _is_excel(name):
         df = pd.read_excel(file)
     else:
         df = pd.read_csv(file)
     return df
 
-def auto_etl(df):
-    df = df.copy()
-    df.columns = [str(c).strip() for c in df.columns]
-    df = df.dropna(axis=1, how="all")
-    df = df.drop_duplicates()
-    for c in df.columns:
-        if df[c].dtype == "object":
+def _input_size(file):
+    if isinstance(file, (str, os.PathLike)):
+        return os.path.getsize(file)
+    size = getattr(file, "size", None)
+    if size:
+        return size
+    try:
+        pos = file.tell()
+        file.seek(0, os.SEEK_END)
+        size = file.tell()
+        file.seek(pos)
+        return size
+    except Exception:
+        return None
+
+def _iter_csv_chunks(file, chunksize):
+    total = _input_size(file)
+    handle = open(file, "rb") if isinstance(file, (str, os.PathLike)) else file
+    try:
+        for chunk in pd.read_csv(handle, chunksize=chunksize):
             try:
-                parsed = pd.to_datetime(df[c], errors="raise")
-                if parsed.notna().sum() >= 0.8 * len(parsed):
-                    df[c] = parsed
+                progress = min(handle.tell() / total, 1.0) if total else None
             except Exception:
-                pass
-    for c in df.columns:
-        if pd.api.types.is_numeric_dtype(df[c]):
-            df[c] = df[c].fillna(df[c].median())
+                progress = None
+            yield chunk, progress
+    finally:
+        if handle is not file:
+            handle.close()
+
+def _iter_excel_chunks(file, chunksize):
+    name = str(getattr(file, "name", file))
+    if name.lower().endswith(".xls"):
+        # openpyxl cannot stream legacy .xls, so slice the parsed sheet instead
+        df = pd.read_excel(file)
+        for start in range(0, len(df), chunksize):
+            yield df.iloc[start:start + chunksize], min((start + chunksize) / max(len(df), 1), 1.0)
+        return
+    from openpyxl import load_workbook
+    wb = load_workbook(file, read_only=True, data_only=True)
+    try:
+        ws = wb.active
+        total = (ws.max_row - 1) if ws.max_row else None
+        rows = ws.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        header = [f"Unnamed: {i}" if h is None else h for i, h in enumerate(header)]
+        batch, done = [], 0
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= chunksize:
+                done += len(batch)
+                yield pd.DataFrame(batch, columns=header), min(done / total, 1.0) if total else None
+                batch = []
+        if batch:
+            yield pd.DataFrame(batch, columns=header), 1.0
+    finally:
+        wb.close()
+
+def iter_chunks(file, chunksize=CHUNK_ROWS):
+    """Yield (chunk, progress) pairs, progress being the fraction of the input read so far (None if unknown)."""
+    name = getattr(file, "name", file if isinstance(file, (str, os.PathLike)) else "uploaded")
+    if _is_excel(name):
+        yield from _iter_excel_chunks(file, chunksize)
+    else:
+        yield from _iter_csv_chunks(file, chunksize)
+
+SAMPLE_ROWS = 5_000
+CATEGORY_MAX_UNIQUE = 50
+_TRUE = {"true", "yes", "y", "t", "1"}
+_FALSE = {"false", "no", "n", "f", "0"}
+_CURRENCY = r"[\s$€£₹¥]"
+_GROUPED = r"-?\d{1,3}(?:,\d{3})+(?:\.\d+)?"
+_DECIMAL_COMMA = r"-?\d{1,3}(?:\.\d{3})+(?:,\d+)?|-?\d+(?:,\d+)?"
+
+def _parse_numbers(s, decimal="."):
+    """
+    Numbers written with currency symbols, thousands separators or a trailing % (divided by 100).
+    decimal="." accepts commas only as grouped thousands (1,234.5); decimal="," reads 1.234,5 and 2,25.
+    Anything else becomes NaN rather than a silently different number.
+    """
+    text = s.astype(str).str.replace(_CURRENCY, "", regex=True)
+    percent = text.str.endswith("%")
+    text = text.str.removesuffix("%")
+    if decimal == ",":
+        text = text.where(text.str.fullmatch(_DECIMAL_COMMA)).str.replace(".", "", regex=False).str.replace(",", ".", regex=False)
+    else:
+        text = text.where(~text.str.contains(",", regex=False) | text.str.fullmatch(_GROUPED)).str.replace(",", "", regex=False)
+    values = pd.to_numeric(text, errors="coerce")
+    return values.where(~percent, values / 100)
+
+def _sample(s, sample_rows, seed):
+    s = s.dropna()
+    return s.sample(sample_rows, random_state=seed) if len(s) > sample_rows else s
+
+def _sniff_datetime(sample):
+    try:
+        from pandas.tseries.api import guess_datetime_format
+    except ImportError:
+        guess_datetime_format = None
+    candidates = []
+    if guess_datetime_format is not None:
+        for v in sample.head(20):
+            for dayfirst in (False, True):
+                with warnings.catch_warnings():
+                    warnings.simplefilter("ignore")
+                    fmt = guess_datetime_format(v, dayfirst=dayfirst)
+                if fmt and fmt not in candidates:
+                    candidates.append(fmt)
+    best, best_rate = None, 0.0
+    for fmt in candidates:
+        rate = pd.to_datetime(sample, format=fmt, errors="coerce").notna().mean()
+        if rate > best_rate:
+            best, best_rate = fmt, rate
+    return best if best_rate >= 0.8 else None
+
+def _infer_column(s, sample_rows, seed):
+    if pd.api.types.is_bool_dtype(s):
+        return {"kind": "bool"}
+    if pd.api.types.is_numeric_dtype(s):
+        return {"kind": "numeric", "integer": True} if pd.api.types.is_integer_dtype(s) else {"kind": "numeric"}
+    if pd.api.types.is_datetime64_any_dtype(s):
+        return {"kind": "datetime", "format": None}
+    sample = _sample(s, sample_rows, seed)
+    if sample.empty:
+        return {"kind": "text"}
+    text = sample.astype(str).str.strip()
+    lowered = set(text.str.lower().unique())
+    if lowered <= (_TRUE | _FALSE) and len(lowered) <= 2:
+        return {"kind": "bool"}
+    if pd.to_numeric(text, errors="coerce").notna().mean() >= 0.8:
+        return {"kind": "numeric", "clean": False}
+    for decimal in (".", ","):
+        if _parse_numbers(text, decimal).notna().mean() >= 0.8:
+            return {"kind": "numeric", "clean": True, "decimal": decimal}
+    fmt = _sniff_datetime(text)
+    if fmt:
+        return {"kind": "datetime", "format": fmt}
+    uniques = text.nunique()
+    if uniques <= CATEGORY_MAX_UNIQUE and uniques <= 0.5 * len(text):
+        return {"kind": "category"}
+    return {"kind": "text"}
+
+class SeenRows:
+    """Sorted 64-bit row hashes already kept, so dedupe can drop repeats across streamed chunks."""
+
+    def __init__(self):
+        self.hashes = np.empty(0, dtype=np.uint64)
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def add(self, hashes):
+        # merge the sorted newcomers in one O(n + m) pass rather than re-sorting everything seen
+        new = np.sort(np.asarray(hashes, dtype=np.uint64))
+        self.hashes = np.insert(self.hashes, np.searchsorted(self.hashes, new), new)
+
+    def contains(self, hashes):
+        if not len(self.hashes):
+            return np.zeros(len(hashes), dtype=bool)
+        pos = np.searchsorted(self.hashes, hashes).clip(max=len(self.hashes) - 1)
+        return self.hashes[pos] == hashes
+
+def _first_rows(df, subset=None, seen=None):
+    if df.empty:
+        return np.ones(0, dtype=bool)
+    keys = df if subset is None else df[list(subset)]
+    hashes = pd.util.hash_pandas_object(keys, index=False).to_numpy()
+    keep = ~pd.Series(hashes).duplicated().to_numpy()
+    if seen is not None:
+        keep &= ~seen.contains(hashes)
+        seen.add(hashes[keep])
+    return keep
+
+def dedupe(df, subset=None, seen=None):
+    """
+    Keep the first occurrence of each row (or each `subset` key) by comparing
+    64-bit row hashes instead of whole rows. Pass a SeenRows to carry the
+    kept keys across chunks. Returns (df, dropped_count).
+    """
+    keep = _first_rows(df, subset, seen)
+    dropped = int(len(keep) - keep.sum())
+    return (df[keep] if dropped else df), dropped
+
+def _map_columns(fn, items, workers):
+    items = list(items)
+    if workers is None:
+        workers = ETL_WORKERS
+    if workers <= 1 or len(items) <= 1:
+        return [fn(*item) for item in items]
+    with ThreadPoolExecutor(max_workers=min(workers, len(items))) as pool:
+        return list(pool.map(lambda item: fn(*item), items))
+
+def infer_schema(df, sample_rows=SAMPLE_ROWS, seed=42, workers=None):
+    """
+    Pick a dtype per column from a bounded random sample of its non-null values.
+    Returns {column: {"kind": ..., ...}}, a plain dict that can be stored and
+    passed back to auto_etl/apply_schema for later uploads with the same layout.
+    Columns with no values at all get a placeholder {"kind": "text", "empty": True}: they are
+    kept as plain text without imputation, so a streamed column that only fills in after the
+    first chunk is not dropped.
+    """
+    cols = list(df.columns)
+    specs = _map_columns(lambda c: {"kind": "text", "empty": True} if df[c].isna().all()
+                         else _infer_column(df[c], sample_rows, seed), [(c,) for c in cols], workers)
+    return {str(c).strip(): spec for c, spec in zip(cols, specs)}
+
+def _fill_mode(s):
+    if s.isna().any():
+        mode = s.mode(dropna=True)
+        s = s.fillna(mode.iloc[0] if not mode.empty else "Unknown")
+    return s
+
+def _as_text(s):
+    # one value type per column: every non-null value becomes a str, whole floats without the ".0"
+    s = s.astype(object) if isinstance(s.dtype, pd.CategoricalDtype) else s
+    if pd.api.types.is_float_dtype(s):
+        values = s.dropna()
+        if (values == np.round(values)).all() and (values.abs() < 2 ** 63).all():
+            return pd.Series(values.astype(np.int64).astype(str), dtype=object).reindex(s.index)
+    return s.astype(object).where(s.isna(), s.astype(str))
+
+def _convert(s, spec):
+    """Convert one column per its spec, always to the same dtype per kind so streamed chunks line up:
+    int64 (integer columns while their values stay whole) or float64, datetime64[ns], bool,
+    or str values (as object or category)."""
+    kind = spec["kind"]
+    if kind == "numeric":
+        if spec.get("clean"):
+            s = _parse_numbers(s, spec.get("decimal", "."))
+        if not pd.api.types.is_numeric_dtype(s) or pd.api.types.is_bool_dtype(s):
+            s = pd.to_numeric(s, errors="coerce")
+        if spec.get("integer"):
+            # float64 cannot tell apart integers above 2**53 (long IDs), so whole columns stay int64
+            values = s.dropna()
+            if len(values) and (values == np.round(values)).all() and (values.abs() < 2 ** 63).all():
+                return s.fillna(round(values.median())).astype("int64")
+        s = s.astype("float64")
+        return s.fillna(s.median())
+    if kind == "datetime":
+        if not pd.api.types.is_datetime64_any_dtype(s):
+            s = pd.to_datetime(s, format=spec.get("format"), errors="coerce")
+        if getattr(s.dt, "tz", None) is None:
+            s = s.astype("datetime64[ns]")
+        return _fill_mode(s)
+    if kind == "bool":
+        if not pd.api.types.is_bool_dtype(s):
+            lowered = s.astype(str).str.strip().str.lower()
+            s = lowered.map(dict.fromkeys(_TRUE, True) | dict.fromkeys(_FALSE, False)).where(s.notna())
+        return _fill_mode(s).astype(bool)
+    s = _as_text(s)
+    if not spec.get("empty"):
+        s = _fill_mode(s)
+    return s.astype("category") if kind == "category" else s
+
+def apply_schema(df, schema, workers=None):
+    """Convert each column once according to `schema`; columns missing from the frame come back empty-filled."""
+    df = df.rename(columns=lambda c: str(c).strip())
+    items = [(df[c] if c in df.columns else pd.Series(np.nan, index=df.index, dtype=object), spec)
+             for c, spec in schema.items()]
+    return pd.DataFrame(dict(zip(schema, _map_columns(_convert, items, workers))), index=df.index)
+
+def auto_etl(df, schema=None, inplace=False, workers=None, timings=None, subset=None, stats=None):
+    """
+    Clean an uploaded frame in stages: normalize headers, drop empty columns and
+    duplicate rows, infer a schema (unless one is given) and convert each column.
+    Column stages run on a thread pool of `workers` threads (ETL_WORKERS by default);
+    pandas/NumPy release the GIL for most of that work. inplace=True cleans `df`
+    itself instead of a shallow copy. Pass a dict as `timings` to get seconds per stage.
+    Duplicates are judged on `subset` columns when given; the number dropped is
+    recorded in `stats["duplicates_dropped"]` when a dict is passed.
+    """
+    timings = {} if timings is None else timings
+    clock = time.perf_counter()
+
+    def lap(stage):
+        nonlocal clock
+        now = time.perf_counter()
+        timings[stage] = timings.get(stage, 0.0) + now - clock
+        clock = now
+
+    if not inplace:
+        df = df.copy(deep=False)
+    df.columns = [str(c).strip() for c in df.columns]
+    lap("normalize")
+    empty = _map_columns(lambda c: df[c].isna().all(), [(c,) for c in df.columns], workers)
+    df.drop(columns=[c for c, e in zip(df.columns, empty) if e], inplace=True)
+    lap("drop_empty")
+    keep = _first_rows(df, subset)
+    dropped = int(len(keep) - keep.sum())
+    if dropped:
+        if inplace and df.index.is_unique:
+            df.drop(index=df.index[~keep], inplace=True)
         else:
-            if df[c].isna().any():
-                mode = df[c].mode(dropna=True)
-                df[c] = df[c].fillna(mode.iloc[0] if not mode.empty else "Unknown")
+            df = df[keep]
+    if stats is not None:
+        stats["duplicates_dropped"] = stats.get("duplicates_dropped", 0) + dropped
+    lap("dedupe")
+    if schema is None:
+        schema = infer_schema(df, workers=workers)
+    lap("infer")
+    converted = _map_columns(
+        _convert,
+        [(df[c] if c in df.columns else pd.Series(np.nan, index=df.index, dtype=object), spec)
+         for c, spec in schema.items()],
+        workers)
+    if inplace:
+        df.drop(columns=[c for c in df.columns if c not in schema], inplace=True)
+        for c, s in zip(schema, converted):
+            df[c] = s
+        df = df[list(schema)] if list(df.columns) != list(schema) else df
+    else:
+        df = pd.DataFrame(dict(zip(schema, converted)), index=df.index)
+    lap("convert")
     return df
+
+def auto_etl_chunk(chunk, schema, seen=None, subset=None, stats=None):
+    """
+    Per-chunk auto_etl: same cleaning rules, but columns and dtypes follow `schema` rather than the chunk itself.
+    As in auto_etl, duplicates are judged on the values as read, so imputation or type conversion never merges distinct rows.
+    """
+    chunk = chunk.rename(columns=lambda c: str(c).strip()).reindex(columns=list(schema))
+    chunk, dropped = dedupe(chunk, subset, seen)
+    if stats is not None:
+        stats["duplicates_dropped"] = stats.get("duplicates_dropped", 0) + dropped
+    return apply_schema(chunk, schema)
+
+def iter_etl(file, chunksize=CHUNK_ROWS, schema=None, subset=None, stats=None):
+    """
+    Stream a CSV/Excel upload as cleaned chunks, yielding (chunk, progress) so only one chunk is held at a time.
+    Duplicate rows are dropped across the whole stream, not just within a chunk.
+    """
+    seen = SeenRows()
+    for chunk, progress in iter_chunks(file, chunksize):
+        if schema is None:
+            schema = infer_schema(chunk)
+        yield auto_etl_chunk(chunk, schema, seen, subset, stats), progress
+
+def _downcast(s):
+    if pd.api.types.is_bool_dtype(s):
+        return s
+    if pd.api.types.is_integer_dtype(s):
+        # signed only, so differences like 3 - 5 stay negative. Narrow ints still overflow on
+        # elementwise arithmetic (int8 100 + 100); reductions such as sum/mean accumulate in 64-bit.
+        return pd.to_numeric(s, downcast="integer")
+    if pd.api.types.is_float_dtype(s):
+        values = s.to_numpy()
+        if (s.notna().all() and np.isfinite(values).all() and (np.abs(values) < 2 ** 63).all()
+                and (values == np.round(values)).all()):
+            return _downcast(s.astype(np.int64))
+        small = s.astype(np.float32)
+        if np.array_equal(small.to_numpy().astype(values.dtype), values, equal_nan=True):
+            return small
+    return s
+
+def compact_frame(df, category_ratio=0.5):
+    """
+    Shrink a cleaned frame in memory: low-cardinality strings become `category`
+    and numerics are downcast only where every value survives the round trip.
+    Returns (df, report) with bytes before/after and the dtype change per column.
+    """
+    before = int(df.memory_usage(deep=True).sum())
+    out, changed = {}, {}
+    for c in df.columns:
+        s = df[c]
+        if s.dtype == "object":
+            if len(s) and s.nunique(dropna=True) <= category_ratio * len(s):
+                s = s.astype("category")
+        elif pd.api.types.is_numeric_dtype(s):
+            s = _downcast(s)
+        if s.dtype != df[c].dtype:
+            changed[c] = (str(df[c].dtype), str(s.dtype))
+        out[c] = s
+    df = pd.DataFrame(out, index=df.index)
+    after = int(df.memory_usage(deep=True).sum())
+    return df, {"bytes_before": before, "bytes_after": after, "columns": changed}
+
+CUBE_STATS = ["sum", "count", "min", "max"]
+
+def build_cube(df, measures, dims=(), date_col=None, freq="M"):
+    """
+    One groupby pass over `dims` (plus the `date_col` period at `freq`, as level "period")
+    holding sum/count/min/max of each measure and the row count. Rollups, KPIs and rankings
+    are then answered from the cube in O(groups) with cube_rollup/cube_totals.
+    """
+    measures, dims = list(measures), list(dims)
+    values = df[measures].astype("float64")
+    keys = [df[d] for d in dims]
+    if date_col:
+        keys.append(pd.to_datetime(df[date_col]).dt.to_period(freq).rename("period"))
+    if keys:
+        grouped = values.groupby(keys, observed=True, sort=True)
+        cube = grouped.agg(CUBE_STATS)
+        cube[("_rows", "count")] = grouped.size()
+    else:
+        cube = pd.DataFrame({(m, stat): [values[m].agg(stat)] for m in measures for stat in CUBE_STATS})
+        cube[("_rows", "count")] = len(df)
+    return cube
+
+def cube_rollup(cube, by=(), measure="_rows", stat="count"):
+    """Roll the cube up to the `by` levels (a Series), or to a scalar when `by` is empty. stat="mean" is sum/count."""
+    by = [by] if isinstance(by, str) else list(by)
+    if stat == "mean":
+        return cube_rollup(cube, by, measure, "sum") / cube_rollup(cube, by, measure, "count")
+    col = cube[(measure, stat)]
+    how = "sum" if stat in ("sum", "count") else stat
+    if not by:
+        return col.agg(how)
+    return col.groupby(level=by, observed=True, sort=True).agg(how)
+
+def cube_totals(cube, measure):
+    """Whole-dataset sum, count, min, max and mean of `measure`."""
+    out = {stat: cube_rollup(cube, (), measure, stat) for stat in CUBE_STATS}
+    out["mean"] = out["sum"] / out["count"] if out["count"] else float("nan")
+    return out
+
+def file_digest(file, block=1 << 20):
+    h = hashlib.blake2b(digest_size=20)
+    if isinstance(file, (str, os.PathLike)):
+        with open(file, "rb") as f:
+            for buf in iter(lambda: f.read(block), b""):
+                h.update(buf)
+    else:
+        pos = file.tell()
+        file.seek(0)
+        for buf in iter(lambda: file.read(block), b""):
+            h.update(buf)
+        file.seek(pos)
+    return h.hexdigest()
+
+def evict_lru(cache_dir, max_bytes, suffix, keep=None):
+    """Delete the least recently used `suffix` files in `cache_dir` until they fit in `max_bytes`."""
+    entries = []
+    for name in os.listdir(cache_dir):
+        if not name.endswith(suffix):
+            continue
+        path = os.path.join(cache_dir, name)
+        try:
+            st_ = os.stat(path)
+        except FileNotFoundError:
+            continue
+        entries.append((st_.st_mtime, st_.st_size, path))
+    total = sum(e[1] for e in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        if path == keep:
+            continue
+        try:
+            os.remove(path)
+            total -= size
+        except FileNotFoundError:
+            pass
+
+def chunk_schema(table):
+    """Arrow schema for a stream of chunks: dictionary (category) columns become plain values, since each chunk has its own categories."""
+    import pyarrow as pa
+    return pa.schema([f.with_type(f.type.value_type) if pa.types.is_dictionary(f.type) else f
+                      for f in table.schema], metadata=table.schema.metadata)
+
+def widen_schema(schema, table):
+    """
+    `schema` widened so the next chunk's `table` fits: integer fields become float64 once a chunk holds
+    fractions, and all-null fields take the chunk's type. None if the chunk already fits.
+    """
+    import pyarrow as pa
+    fields = []
+    for f in schema:
+        new = table.schema.field(f.name).type
+        if pa.types.is_integer(f.type) and pa.types.is_floating(new):
+            f = f.with_type(pa.float64())
+        elif pa.types.is_null(f.type) and not pa.types.is_null(new):
+            f = f.with_type(new.value_type if pa.types.is_dictionary(new) else new)
+        fields.append(f)
+    return pa.schema(fields, metadata=schema.metadata) if not pa.schema(fields).equals(schema) else None
+
+def _raw_spec(s):
+    if s.isna().all():
+        return {"kind": "text"}
+    if pd.api.types.is_bool_dtype(s):
+        return {"kind": "bool"}
+    if pd.api.types.is_integer_dtype(s):
+        return {"kind": "int"}
+    if pd.api.types.is_numeric_dtype(s):
+        return {"kind": "float"}
+    if pd.api.types.is_datetime64_any_dtype(s):
+        return {"kind": "datetime", "format": None}
+    # CSV dates arrive as strings; the same sniffing as infer_schema makes them datetime64 for date filters
+    fmt = _sniff_datetime(_sample(s, SAMPLE_ROWS, 42).astype(str).str.strip())
+    return {"kind": "datetime", "format": fmt} if fmt else {"kind": "text"}
+
+def _raw_column(s, spec):
+    # later chunks follow the first chunk's kind; int columns that gain gaps or fractions are widened by the writer
+    kind = spec["kind"]
+    if kind in ("int", "float"):
+        if not pd.api.types.is_numeric_dtype(s) or pd.api.types.is_bool_dtype(s):
+            s = pd.to_numeric(s, errors="coerce")
+        return s.astype("float64") if kind == "float" else s
+    if kind == "datetime":
+        if not pd.api.types.is_datetime64_any_dtype(s):
+            s = pd.to_datetime(s, format=spec["format"], errors="coerce")
+        return s.astype("datetime64[ns]") if getattr(s.dt, "tz", None) is None else s
+    if kind == "bool":
+        return s if pd.api.types.is_bool_dtype(s) else s.where(s.isin([True, False]))
+    return _as_text(s)
+
+def _raw_frames(file, chunksize):
+    """
+    The plain parse (no dedupe, imputation or value cleaning), streamed chunk by chunk. Numbers, bools and
+    dates keep pandas' own dtypes as fixed by the first chunk (later values that do not fit become missing),
+    and text columns that sniff as dates are parsed to datetime64; everything else, including object columns
+    mixing value types (common in Excel), becomes str so Arrow can hold it.
+    """
+    specs = None
+    for chunk, progress in iter_chunks(file, chunksize):
+        if specs is None:
+            specs = [_raw_spec(chunk.iloc[:, i]) for i in range(chunk.shape[1])]
+        chunk = chunk.copy(deep=False)
+        for i, spec in enumerate(specs):
+            chunk.isetitem(i, _raw_column(chunk.iloc[:, i], spec))
+        yield chunk, progress
+
+def _write_cache(frames, path, on_progress):
+    import pyarrow as pa
+    tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+    writer, schema = None, None
+    try:
+        for chunk, progress in frames:
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                # IPC files cannot replace dictionaries; categories are restored from the pandas metadata on load
+                schema = chunk_schema(table)
+                writer = pa.ipc.new_file(tmp, schema)
+            wider = widen_schema(schema, table)
+            if wider is not None:
+                # IPC files have one schema, so copy what is written so far into a file with the wider one
+                writer.close()
+                old, tmp, schema = tmp, f"{path}.{uuid.uuid4().hex}.tmp", wider
+                writer = pa.ipc.new_file(tmp, schema)
+                with pa.memory_map(old, "r") as source:
+                    writer.write_table(pa.ipc.open_file(source).read_all().cast(schema, safe=False))
+                os.remove(old)
+            # after widen_schema the only lossy cast left is int64 -> float64, which rounds above 2**53 as pandas would
+            writer.write_table(table.cast(schema, safe=False))
+            if on_progress and progress is not None:
+                on_progress(progress)
+        if writer is None:
+            return False
+        writer.close()
+        os.replace(tmp, path)
+        return True
+    finally:
+        if os.path.exists(tmp):
+            if writer is not None:
+                writer.close()
+            os.remove(tmp)
+
+def load_dataset(file, cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES, chunksize=CHUNK_ROWS, on_progress=None,
+                 clean=True):
+    """
+    read_any + auto_etl behind a content-addressed Arrow IPC cache.
+    The cleaned frame is written once per distinct upload and later loads memory-map the file.
+    clean=False caches the plain parse instead: no dedupe, imputation or value cleaning,
+    for pages where identical rows are real records (e.g. repeated sales) and totals must match the file.
+    Either way the upload is streamed in `chunksize` rows, so it is never held whole in memory.
+    Returns (df, key) where key is the content hash of the upload.
+    """
+    import pyarrow as pa
+    os.makedirs(cache_dir, exist_ok=True)
+    key = file_digest(file)
+    path = os.path.join(cache_dir, f"{key}.arrow" if clean else f"{key}.raw.arrow")
+    if os.path.exists(path):
+        os.utime(path)
+    else:
+        if hasattr(file, "seek"):
+            file.seek(0)
+        frames = iter_etl(file, chunksize) if clean else _raw_frames(file, chunksize)
+        if not _write_cache(frames, path, on_progress):
+            return pd.DataFrame(), key
+        evict_lru(cache_dir, max_bytes, ".arrow", keep=path)
+    with pa.memory_map(path, "r") as source:
+        table = pa.ipc.open_file(source).read_all()
+        meta = table.schema.pandas_metadata or {}
+        categories = [c["name"] for c in meta.get("columns", []) if c.get("pandas_type") == "categorical"]
+        df = table.to_pandas(split_blocks=True, categories=categories)
+    return df, key
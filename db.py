@@ -1,74 +1,401 @@
-import sqlite3, os, bcrypt
+import sqlite3, os, time, json, logging, bcrypt, atexit, queue, threading
+from collections import defaultdict
+from contextlib import contextmanager
+
+log = logging.getLogger(__name__)
 
 DB_PATH = os.path.join(os.path.dirname(__file__), "app.db")
+POOL_SIZE = 8
+BUSY_TIMEOUT_MS = 5000
+# longer than the busy timeout, so a checkout outlasts holders that are themselves waiting on a lock
+POOL_WAIT_SECONDS = 2 * BUSY_TIMEOUT_MS / 1000
+STATEMENT_CACHE = 256
+BCRYPT_ROUNDS = 12
+WRITE_BATCH_ROWS = 200
+WRITE_FLUSH_MS = 250
+WRITE_QUEUE_SIZE = 10_000
 
 def get_conn():
-    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+    """A new, unpooled connection with the pool's settings; the caller must close it."""
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False, timeout=BUSY_TIMEOUT_MS / 1000,
+                           cached_statements=STATEMENT_CACHE)
     conn.row_factory = sqlite3.Row
+    # WAL lets readers run alongside the single writer; NORMAL sync is durable at checkpoints under WAL
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    conn.execute("PRAGMA synchronous=NORMAL")
     return conn
 
+class ConnectionPool:
+    """
+    Up to `size` long-lived connections to one database file, handed out per thread.
+    Reused connections keep their prepared-statement cache between calls.
+    """
+
+    def __init__(self, path, size=POOL_SIZE):
+        self.path = path
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._all = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if len(self._all) < self.size:
+                conn = get_conn()
+                self._all.append(conn)
+                return conn
+        try:
+            return self._idle.get(timeout=POOL_WAIT_SECONDS)
+        except queue.Empty:
+            raise sqlite3.OperationalError("connection pool exhausted") from None
+
+    @contextmanager
+    def connection(self):
+        """
+        Check out this thread's connection (nested uses share it). The outermost block commits
+        on success and rolls back on error before the connection returns to the pool.
+        """
+        held = getattr(self._local, "held", None)
+        if held is not None:
+            self._local.depth += 1
+            try:
+                yield held
+            finally:
+                self._local.depth -= 1
+            return
+        conn = self._acquire()
+        self._local.held, self._local.depth = conn, 0
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            self._local.held = None
+            self._idle.put(conn)
+
+    def close_all(self):
+        with self._lock:
+            for conn in self._all:
+                conn.close()
+            self._all.clear()
+            self._idle = queue.LifoQueue()
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def _pool():
+    with _pools_lock:
+        if DB_PATH not in _pools:
+            _pools[DB_PATH] = ConnectionPool(DB_PATH)
+        return _pools[DB_PATH]
+
+def connection():
+    """Pooled connection context for DB_PATH: `with connection() as conn: ...` commits on exit."""
+    return _pool().connection()
+
+@atexit.register
+def close_pools():
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close_all()
+        _pools.clear()
+
+_STOP = object()
+
+class WriteBehind:
+    """
+    Fire-and-forget INSERTs written by one background thread in batches: a batch is committed as a
+    single transaction once it has `batch_rows` rows or `flush_ms` after its first row arrived.
+    When `max_pending` rows are waiting, put() blocks for up to BUSY_TIMEOUT_MS and then writes its
+    row inline, so a stalled writer slows callers down instead of losing rows or memory.
+    Statements are grouped per batch, so rows of different statements may commit out of order.
+    """
+
+    def __init__(self, batch_rows=WRITE_BATCH_ROWS, flush_ms=WRITE_FLUSH_MS, max_pending=WRITE_QUEUE_SIZE):
+        self.batch_rows = batch_rows
+        self.flush_ms = flush_ms
+        self.queue = queue.Queue(max_pending)
+        self.written = 0
+        self.failed = 0
+        self._thread = None
+        self._lock = threading.Lock()
+        self._registered = False
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, daemon=True, name="db-write-behind")
+                self._thread.start()
+                if not self._registered:
+                    # registered after close_pools, so it runs first at exit
+                    atexit.register(self.close)
+                    self._registered = True
+
+    def put(self, sql, params):
+        self._start()
+        try:
+            self.queue.put((sql, tuple(params)), timeout=BUSY_TIMEOUT_MS / 1000)
+        except queue.Full:
+            with connection() as conn:
+                conn.execute(sql, params)
+
+    def _loop(self):
+        try:
+            init_db()
+        except Exception:
+            log.exception("Could not prepare the database for queued writes")
+        stop = False
+        while not stop:
+            item = self.queue.get()
+            if item is _STOP:
+                self.queue.task_done()
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.flush_ms / 1000
+            while len(batch) < self.batch_rows:
+                try:
+                    item = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+            self._write(batch)
+            for _ in range(len(batch) + stop):
+                self.queue.task_done()
+
+    def _write(self, batch):
+        grouped = defaultdict(list)
+        for sql, params in batch:
+            grouped[sql].append(params)
+        try:
+            with connection() as conn:
+                for sql, rows in grouped.items():
+                    conn.executemany(sql, rows)
+            self.written += len(batch)
+        except Exception:
+            # any failure (locked database, exhausted pool, bad row) costs this batch, never the thread
+            log.exception("Dropped a batch of %d queued writes", len(batch))
+            self.failed += len(batch)
+
+    def flush(self):
+        """Block until every row queued so far is committed (or has failed)."""
+        self.queue.join()
+
+    def close(self):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self.queue.put(_STOP)
+            thread.join()
+
+WRITER = WriteBehind()
+
+def _utc_now():
+    # the row's own time, not when its batch happens to be committed
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime())
+
+# Each migration runs once, in order, in its own transaction; append new ones, never edit applied ones.
+# Version 1 is the schema init_db used to create, so existing databases just record it.
+MIGRATIONS = [
+    (1, [
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            email TEXT PRIMARY KEY,
+            name TEXT,
+            password_hash BLOB NOT NULL,
+            role TEXT DEFAULT 'user',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS feedback (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_email TEXT,
+            message TEXT,
+            rating INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS models (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            dataset_hash TEXT NOT NULL,
+            target TEXT NOT NULL,
+            features TEXT NOT NULL,
+            model_name TEXT,
+            metrics TEXT,
+            train_seconds REAL,
+            artifact_path TEXT NOT NULL,
+            hits INTEGER DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_used_at TIMESTAMP
+        );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS report_jobs (
+            id TEXT PRIMARY KEY,
+            job_key TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',
+            progress REAL DEFAULT 0,
+            params TEXT,
+            owner_email TEXT,
+            result_path TEXT,
+            error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            user_email TEXT,
+            detail TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS sessions (
+            id TEXT PRIMARY KEY,
+            user_email TEXT NOT NULL,
+            expires_at REAL NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        """,
+    ]),
+    (2, [
+        # covers list_users: keyset order and every listed column come straight from the index
+        "CREATE INDEX IF NOT EXISTS idx_users_created ON users (created_at, email, name, role)",
+        "CREATE INDEX IF NOT EXISTS idx_feedback_user ON feedback (user_email, created_at, id)",
+        "CREATE INDEX IF NOT EXISTS idx_feedback_created ON feedback (created_at, id)",
+        "CREATE INDEX IF NOT EXISTS idx_events_kind ON events (kind, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions (expires_at)",
+        "CREATE INDEX IF NOT EXISTS idx_models_lookup ON models (dataset_hash, target, features)",
+        "CREATE INDEX IF NOT EXISTS idx_report_jobs_key ON report_jobs (job_key, created_at)",
+    ]),
+]
+
+def schema_version():
+    with connection() as conn:
+        conn.execute("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER PRIMARY KEY, applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)")
+        return conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version").fetchone()[0]
+
+def migrate():
+    """Apply pending MIGRATIONS. Returns the versions applied."""
+    applied = []
+    for version, statements in MIGRATIONS:
+        if version <= schema_version():
+            continue
+        with connection() as conn:
+            # take the write lock before re-checking so concurrent processes apply each version once
+            if not conn.in_transaction:
+                conn.execute("BEGIN IMMEDIATE")
+            if conn.execute("SELECT 1 FROM schema_version WHERE version=?", (version,)).fetchone():
+                continue
+            for sql in statements:
+                conn.execute(sql)
+            conn.execute("INSERT INTO schema_version (version) VALUES (?)", (version,))
+        applied.append(version)
+    return applied
+
 def init_db():
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS users (
-        email TEXT PRIMARY KEY,
-        name TEXT,
-        password_hash BLOB NOT NULL,
-        role TEXT DEFAULT 'user',
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    );
-    """)
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS feedback (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_email TEXT,
-        message TEXT,
-        rating INTEGER,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    );
-    """)
-    conn.commit()
-
-    cur.execute("SELECT COUNT(*) as c FROM users WHERE email=?", ("admin@example.com",))
-    row = cur.fetchone()
-    if row is None or row["c"] == 0:
-        hashed = bcrypt.hashpw(b"admin123", bcrypt.gensalt())
-        cur.execute("INSERT OR REPLACE INTO users (email, name, password_hash, role) VALUES (?, ?, ?, ?)",
-                    ("admin@example.com", "Admin", hashed, "admin"))
-        conn.commit()
+    migrate()
+    with connection() as conn:
+        row = conn.execute("SELECT COUNT(*) as c FROM users WHERE email=?", ("admin@example.com",)).fetchone()
+        if row is None or row["c"] == 0:
+            hashed = bcrypt.hashpw(b"admin123", bcrypt.gensalt(BCRYPT_ROUNDS))
+            conn.execute("INSERT OR REPLACE INTO users (email, name, password_hash, role) VALUES (?, ?, ?, ?)",
+                         ("admin@example.com", "Admin", hashed, "admin"))
 
 def create_user(email: str, name: str, password: str, role: str = "user"):
-    conn = get_conn()
-    cur = conn.cursor()
-    hashed = bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt())
-    cur.execute("INSERT OR REPLACE INTO users (email, name, password_hash, role) VALUES (?, ?, ?, ?)",
-                (email.lower(), name, hashed, role))
-    conn.commit()
+    hashed = bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(BCRYPT_ROUNDS))
+    with connection() as conn:
+        conn.execute("INSERT OR REPLACE INTO users (email, name, password_hash, role) VALUES (?, ?, ?, ?)",
+                     (email.lower(), name, hashed, role))
 
 def get_user(email: str):
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM users WHERE email=?", (email.lower(),))
-    row = cur.fetchone()
+    with connection() as conn:
+        row = conn.execute("SELECT * FROM users WHERE email=?", (email.lower(),)).fetchone()
     return dict(row) if row else None
 
-def verify_user(email: str, password: str):
-    u = get_user(email)
-    if not u:
-        return None
-    ok = bcrypt.checkpw(password.encode("utf-8"), u["password_hash"])
-    return u if ok else None
+def update_password_hash(email: str, password_hash: bytes):
+    with connection() as conn:
+        conn.execute("UPDATE users SET password_hash=? WHERE email=?", (password_hash, email.lower()))
 
 def list_users():
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("SELECT email, name, role, created_at FROM users ORDER BY created_at DESC")
-    return [dict(r) for r in cur.fetchall()]
+    with connection() as conn:
+        rows = conn.execute("SELECT email, name, role, created_at FROM users ORDER BY created_at DESC, email DESC").fetchall()
+    return [dict(r) for r in rows]
+
+def list_users_page(limit: int = 50, after=None):
+    """
+    One page of list_users, newest first. `after` is the cursor returned with the previous page;
+    returns (rows, cursor) with cursor None on the last page. Seeks on idx_users_created, so any
+    page costs the same however deep it is.
+    """
+    where, params = "", ()
+    if after is not None:
+        where, params = "WHERE (created_at, email) < (?, ?)", tuple(after)
+    with connection() as conn:
+        rows = conn.execute(f"""SELECT email, name, role, created_at FROM users {where}
+                                ORDER BY created_at DESC, email DESC LIMIT ?""", (*params, limit + 1)).fetchall()
+    rows = [dict(r) for r in rows]
+    cursor = (rows[limit - 1]["created_at"], rows[limit - 1]["email"]) if len(rows) > limit else None
+    return rows[:limit], cursor
 
 def insert_feedback(email: str, message: str, rating: int):
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("INSERT INTO feedback (user_email, message, rating) VALUES (?, ?, ?)",
-                (email.lower(), message, int(rating)))
-    conn.commit()
+    """Queue the feedback row on WRITER and return immediately."""
+    WRITER.put("INSERT INTO feedback (user_email, message, rating, created_at) VALUES (?, ?, ?, ?)",
+               (email.lower(), message, int(rating), _utc_now()))
+
+def list_feedback_page(limit: int = 50, after=None, user_email: str = None):
+    """Feedback newest first, optionally for one user, keyset-paginated like list_users_page."""
+    clauses, params = [], []
+    if user_email:
+        clauses.append("user_email = ?")
+        params.append(user_email.lower())
+    if after is not None:
+        clauses.append("(created_at, id) < (?, ?)")
+        params.extend(after)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    with connection() as conn:
+        rows = conn.execute(f"""SELECT id, user_email, message, rating, created_at FROM feedback {where}
+                                ORDER BY created_at DESC, id DESC LIMIT ?""", (*params, limit + 1)).fetchall()
+    rows = [dict(r) for r in rows]
+    cursor = (rows[limit - 1]["created_at"], rows[limit - 1]["id"]) if len(rows) > limit else None
+    return rows[:limit], cursor
+
+def log_event(kind: str, user_email: str = None, **detail):
+    """Queue a usage event (upload, train, export, ...) on WRITER; `detail` is stored as JSON."""
+    WRITER.put("INSERT INTO events (kind, user_email, detail, created_at) VALUES (?, ?, ?, ?)",
+               (kind, user_email.lower() if user_email else None, json.dumps(detail, default=str), _utc_now()))
+
+def create_session(session_id: str, email: str, expires_at: float):
+    with connection() as conn:
+        conn.execute("INSERT INTO sessions (id, user_email, expires_at) VALUES (?, ?, ?)",
+                     (session_id, email.lower(), expires_at))
+
+def get_session(session_id: str):
+    """The session joined with its user's email, name and role, or None if it does not exist."""
+    with connection() as conn:
+        row = conn.execute("""SELECT s.id, s.expires_at, u.email, u.name, u.role FROM sessions s
+                              JOIN users u ON u.email = s.user_email WHERE s.id=?""", (session_id,)).fetchone()
+    return dict(row) if row else None
+
+def delete_session(session_id: str):
+    with connection() as conn:
+        conn.execute("DELETE FROM sessions WHERE id=?", (session_id,))
+
+def purge_expired_sessions(now: float):
+    with connection() as conn:
+        return conn.execute("DELETE FROM sessions WHERE expires_at <= ?", (now,)).rowcount
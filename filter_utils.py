@@ -0,0 +1,111 @@
+import numpy as np, pandas as pd
+
+class FilterIndex:
+    """
+    Per-column indexes over a frame, built lazily the first time a column is filtered on and
+    then reused on every rerun. Categorical/text/bool columns keep row positions grouped by
+    value code; numeric and datetime columns keep positions sorted by value for binary-searched
+    ranges. Positions are int32 below 2**31 rows. Queries return row positions; the frame itself
+    is never copied.
+    """
+
+    def __init__(self, df, columns=None):
+        self.df = df
+        self.n = len(df)
+        self.columns = set(df.columns if columns is None else columns)
+        self.values = {}
+        self.ranges = {}
+        self._positions_dtype = np.int32 if self.n < 2 ** 31 else np.int64
+
+    @staticmethod
+    def _is_range(s):
+        return (pd.api.types.is_numeric_dtype(s) and not pd.api.types.is_bool_dtype(s)) or pd.api.types.is_datetime64_any_dtype(s)
+
+    def _ensure(self, c):
+        if c in self.values or c in self.ranges:
+            return
+        if c not in self.columns:
+            raise KeyError(f"Column {c!r} is not indexed")
+        s = self.df[c]
+        if self._is_range(s):
+            self._index_range(c, s)
+        else:
+            self._index_values(c, s)
+
+    def _index_values(self, c, s):
+        codes, uniques = pd.factorize(s, sort=True)
+        order = np.argsort(codes, kind="stable").astype(self._positions_dtype)
+        bounds = np.searchsorted(codes[order], np.arange(-1, len(uniques) + 1))
+        # bounds[0]:bounds[1] are the missing values (code -1); value k sits at bounds[k + 1]:bounds[k + 2]
+        self.values[c] = ({v: k for k, v in enumerate(uniques)}, order, bounds)
+
+    def _index_range(self, c, s):
+        is_dt = pd.api.types.is_datetime64_any_dtype(s)
+        if is_dt:
+            values = s.to_numpy(dtype="datetime64[ns]")
+        elif isinstance(s.dtype, np.dtype):
+            values = s.to_numpy()  # native width: a compacted int16 column stays 2 bytes per row
+        else:
+            values = s.to_numpy(dtype="float64", na_value=np.nan)
+        valid = ~np.isnat(values) if is_dt else (~np.isnan(values) if values.dtype.kind == "f" else np.ones(len(values), dtype=bool))
+        order = np.flatnonzero(valid)[np.argsort(values[valid], kind="stable")].astype(self._positions_dtype)
+        self.ranges[c] = (values[order], order, is_dt)
+
+    def categories(self, c):
+        self._ensure(c)
+        return list(self.values[c][0])
+
+    def bounds(self, c):
+        """(min, max) of a range column, or (None, None) if it has no values. Does not build the index."""
+        if c in self.ranges:
+            sorted_values, _, _ = self.ranges[c]
+            return (sorted_values[0], sorted_values[-1]) if len(sorted_values) else (None, None)
+        s = self.df[c]
+        lo, hi = s.min(), s.max()
+        return (None, None) if pd.isna(lo) else (lo, hi)
+
+    def _positions(self, c, op, arg):
+        self._ensure(c)
+        if c in self.values:
+            lookup, order, bounds = self.values[c]
+            if op == "==":
+                arg = [arg]
+            elif op != "in":
+                raise ValueError(f"Column {c!r} supports '==' and 'in', not {op!r}")
+            parts = [order[bounds[lookup[v] + 1]:bounds[lookup[v] + 2]] for v in arg if v in lookup]
+            return np.concatenate(parts) if parts else np.empty(0, dtype=self._positions_dtype)
+        sorted_values, order, is_dt = self.ranges[c]
+        if op == "==":
+            op, arg = "between", (arg, arg)
+        if op != "between":
+            raise ValueError(f"Column {c!r} supports '==' and 'between', not {op!r}")
+        lo, hi = arg
+        cast = (lambda v: np.datetime64(pd.Timestamp(v), "ns")) if is_dt else float
+        start = 0 if lo is None else np.searchsorted(sorted_values, cast(lo), side="left")
+        stop = len(sorted_values) if hi is None else np.searchsorted(sorted_values, cast(hi), side="right")
+        return order[start:stop]
+
+    def mask(self, conditions, how="and"):
+        """
+        Boolean row mask for `conditions` combined with "and"/"or". A condition is
+        (column, "==", value), (column, "in", values), (column, "between", (lo, hi)) with
+        either bound None for open ranges, or a nested {"how": ..., "conditions": [...]}.
+        """
+        combined = np.ones(self.n, dtype=bool) if how == "and" else np.zeros(self.n, dtype=bool)
+        for cond in conditions:
+            if isinstance(cond, dict):
+                m = self.mask(cond["conditions"], cond.get("how", "and"))
+            else:
+                m = np.zeros(self.n, dtype=bool)
+                m[self._positions(*cond)] = True
+            if how == "and":
+                combined &= m
+            else:
+                combined |= m
+        return combined
+
+    def query(self, conditions, how="and"):
+        """Row positions (ascending) matching `conditions`; every row when there are none."""
+        if not conditions:
+            return np.arange(self.n)
+        return np.flatnonzero(self.mask(conditions, how))
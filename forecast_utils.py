@@ -0,0 +1,95 @@
+import numpy as np, pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+from threadpoolctl import threadpool_limits
+from ml_utils import CORES, RF_PARAMS, SESSION_CPU_BUDGET, _metrics
+
+LAGS = (1, 7, 14)
+WINDOWS = (7, 28)
+
+def make_panel(df, date_col, target, group_cols=None, freq="D"):
+    """
+    Aggregate `target` into a dense (series x period) matrix at frequency `freq`.
+    Missing periods count as 0. Returns (Y, groups, periods) where `groups` is a
+    frame of the group key per row of Y.
+    """
+    group_cols = list(group_cols or [])
+    period = pd.to_datetime(df[date_col]).dt.to_period(freq)
+    keys = [df[c] for c in group_cols] + [period.rename("_period")]
+    totals = df[target].astype("float64").groupby(keys, observed=True).sum()
+    periods = pd.period_range(period.min(), period.max(), freq=freq)
+    if group_cols:
+        wide = totals.unstack("_period").reindex(columns=periods, fill_value=0.0).fillna(0.0)
+        groups = wide.index.to_frame(index=False)
+    else:
+        wide = totals.reindex(periods, fill_value=0.0).to_frame().T
+        groups = pd.DataFrame(index=[0])
+    return wide.to_numpy(dtype="float64"), groups, periods
+
+def feature_names(lags=LAGS, windows=WINDOWS):
+    return ([f"lag_{l}" for l in lags] + [f"roll_mean_{w}" for w in windows]
+            + ["series", "month", "dayofweek", "dayofyear", "quarter"])
+
+def build_features(Y, periods, start, stop, lags=LAGS, windows=WINDOWS):
+    """
+    Feature rows for every series at periods [start, stop), all from array slicing:
+    lags read Y[:, t - lag], rolling means come from a running cumulative sum.
+    Rows are ordered series-major. Returns (X, y) with y = Y[:, start:stop].ravel().
+    """
+    G = Y.shape[0]
+    t = np.arange(start, stop)
+    cs = np.concatenate([np.zeros((G, 1)), np.cumsum(Y, axis=1)], axis=1)
+    cols = [Y[:, t - l] for l in lags]
+    cols += [(cs[:, t] - cs[:, t - w]) / w for w in windows]
+    stamps = periods[start:stop].to_timestamp()
+    cols.append(np.broadcast_to(np.arange(G, dtype="float64")[:, None], (G, len(t))))
+    for part in (stamps.month, stamps.dayofweek, stamps.dayofyear, stamps.quarter):
+        cols.append(np.broadcast_to(np.asarray(part, dtype="float64")[None, :], (G, len(t))))
+    X = np.stack(cols, axis=-1).reshape(G * len(t), -1)
+    return X, Y[:, start:stop].ravel()
+
+def _fit(Y, periods, stop, lags, windows, n_jobs):
+    start = max(max(lags), max(windows))
+    X, y = build_features(Y, periods, start, stop, lags, windows)
+    with threadpool_limits(limits=n_jobs):
+        return RandomForestRegressor(**RF_PARAMS, n_jobs=n_jobs).fit(X, y)
+
+def _roll_forward(model, Y, periods, horizon, lags, windows):
+    """Recursive multi-step forecast: one batched predict per step covering every series."""
+    G, T = Y.shape
+    Y = np.concatenate([Y, np.zeros((G, horizon))], axis=1)
+    periods = pd.period_range(periods[0], periods=T + horizon, freq=periods.freq)
+    for t in range(T, T + horizon):
+        X, _ = build_features(Y, periods, t, t + 1, lags, windows)
+        Y[:, t] = model.predict(X)
+    return Y[:, T:], periods[T:]
+
+def forecast(df, date_col, target, group_cols=None, horizon=14, freq="D",
+             lags=LAGS, windows=WINDOWS, folds=3, cpu_budget=None):
+    """
+    Forecast `target` `horizon` periods ahead for every series in `group_cols` with one
+    global forest over lag, rolling-mean and calendar features.
+    Walk-forward validation refits on data up to each of the last `folds` cutoffs
+    (spaced `horizon` apart) and scores a recursive forecast of the following periods.
+    Returns {"forecast": frame of group keys, date and prediction, "validation": per-fold
+    and mean metrics, "model": the model fitted on all history}.
+    """
+    Y, groups, periods = make_panel(df, date_col, target, group_cols, freq)
+    start = max(max(lags), max(windows))
+    if Y.shape[1] <= start + 1:
+        raise ValueError(f"Need more than {start + 1} periods of history at frequency {freq!r}, got {Y.shape[1]}.")
+    validation = []
+    with CORES.borrow(cpu_budget or SESSION_CPU_BUDGET) as cores:
+        for f in range(folds):
+            cutoff = Y.shape[1] - (folds - f) * horizon
+            if cutoff <= start + 1:
+                continue
+            model = _fit(Y, periods, cutoff, lags, windows, cores)
+            pred, _ = _roll_forward(model, Y[:, :cutoff], periods[:cutoff], horizon, lags, windows)
+            validation.append({"cutoff": str(periods[cutoff - 1]), **_metrics(Y[:, cutoff:cutoff + horizon].ravel(), pred.ravel())})
+        model = _fit(Y, periods, Y.shape[1], lags, windows, cores)
+    pred, future = _roll_forward(model, Y, periods, horizon, lags, windows)
+    out = groups.loc[groups.index.repeat(horizon)].reset_index(drop=True)
+    out[date_col] = np.tile(future.to_timestamp(), len(groups))
+    out[target] = pred.ravel()
+    summary = {k: float(np.mean([v[k] for v in validation])) for k in ("MAE", "RMSE", "R2")} if validation else None
+    return {"forecast": out, "validation": {"folds": validation, "mean": summary}, "model": model}
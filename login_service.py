@@ -0,0 +1,161 @@
+import os, time, logging, threading, multiprocessing
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import bcrypt
+import numpy as np
+from db import BCRYPT_ROUNDS, get_user, update_password_hash
+
+LOGIN_WORKERS = int(os.environ.get("DD_LOGIN_WORKERS", max(1, min(2, (os.cpu_count() or 1) // 2))))
+MAX_PENDING = LOGIN_WORKERS * 4
+QUEUE_WAIT = 3.0
+ACCOUNT_FAILURES, IP_FAILURES, FAILURE_WINDOW = 5, 20, 15 * 60
+LATENCY_SAMPLES = 1_000
+# bcrypt reads at most 72 bytes of a password and bcrypt 5 raises ValueError past that
+MAX_PASSWORD_BYTES = 72
+
+log = logging.getLogger(__name__)
+
+def _check(password, hashed):
+    return bcrypt.checkpw(password, hashed)
+
+def _hash(password, rounds):
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds))
+
+def hash_rounds(hashed):
+    """Work factor of a bcrypt hash ($2b$<rounds>$...)."""
+    return int(bytes(hashed).split(b"$")[2])
+
+class Throttle:
+    """Failed attempts per key in a sliding window; a key over `limit` is locked until its oldest failure ages out."""
+
+    def __init__(self, limit, window):
+        self.limit, self.window = limit, window
+        self._failures = defaultdict(deque)
+        self._lock = threading.Lock()
+        self._swept = time.monotonic()
+
+    def _trim(self, key, now):
+        q = self._failures[key]
+        while q and q[0] <= now - self.window:
+            q.popleft()
+        if not q:
+            del self._failures[key]
+        return q
+
+    def retry_after(self, key):
+        """Seconds until `key` may try again, 0 if it is not locked."""
+        if key is None:
+            return 0.0
+        now = time.monotonic()
+        with self._lock:
+            q = self._trim(key, now)
+            return max(0.0, q[0] + self.window - now) if len(q) >= self.limit else 0.0
+
+    def fail(self, key):
+        if key is not None:
+            now = time.monotonic()
+            with self._lock:
+                self._failures[key].append(now)
+                if now - self._swept >= self.window:
+                    # a key is otherwise only trimmed when it is checked again, so sprayed keys would pile up
+                    for stale in [k for k, q in self._failures.items() if q[-1] <= now - self.window]:
+                        del self._failures[stale]
+                    self._swept = now
+
+    def reset(self, key):
+        with self._lock:
+            self._failures.pop(key, None)
+
+class LoginService:
+    """
+    Password checks for the login form, off the Streamlit script thread.
+    bcrypt runs in a process pool of `workers`; at most `max_pending` checks are queued or running
+    and callers that cannot get a slot within QUEUE_WAIT are turned away rather than piling up.
+    Failures are throttled per account and per client IP before any hashing is done, and a
+    successful login upgrades hashes made with fewer than BCRYPT_ROUNDS.
+    """
+
+    def __init__(self, workers=LOGIN_WORKERS, max_pending=MAX_PENDING):
+        self.workers = workers
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self.accounts = Throttle(ACCOUNT_FAILURES, FAILURE_WINDOW)
+        self.ips = Throttle(IP_FAILURES, FAILURE_WINDOW)
+        self._latencies = deque(maxlen=LATENCY_SAMPLES)
+        self._dummy_hash = None
+
+    def _executor(self, broken=None):
+        with self._pool_lock:
+            if self._pool is not None and self._pool is broken:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+            if self._pool is None:
+                # spawn: forking the multi-threaded Streamlit server is unsafe
+                self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+            return self._pool
+
+    def _run(self, fn, *args):
+        pool = self._executor()
+        try:
+            return pool.submit(fn, *args).result()
+        except BrokenProcessPool:
+            # a crashed worker breaks the whole executor; replace it once and retry
+            log.warning("Login worker pool broke; restarting it")
+            return self._executor(broken=pool).submit(fn, *args).result()
+
+    def verify(self, email, password, ip=None):
+        """
+        Check `password` for `email`. Returns (user, error) with exactly one of them None;
+        `error` is a message fit to show on the login form.
+        """
+        email = (email or "").strip().lower()
+        wait = max(self.accounts.retry_after(email), self.ips.retry_after(ip))
+        if wait:
+            return None, f"Too many failed attempts. Try again in {int(wait // 60) + 1} min."
+        pw = (password or "").encode("utf-8")
+        if len(pw) > MAX_PASSWORD_BYTES:
+            # no stored hash can match, and bcrypt would raise rather than answer
+            self.accounts.fail(email)
+            self.ips.fail(ip)
+            return None, "Invalid credentials"
+        if not self._slots.acquire(timeout=QUEUE_WAIT):
+            return None, "The server is busy signing other users in. Please try again in a moment."
+        start = time.perf_counter()
+        try:
+            user = get_user(email)
+            if user is None:
+                # hash anyway so unknown accounts take as long as wrong passwords
+                if self._dummy_hash is None:
+                    self._dummy_hash = self._run(_hash, b"dummy", BCRYPT_ROUNDS)
+                self._run(_check, pw, self._dummy_hash)
+                ok = False
+            else:
+                ok = self._run(_check, pw, bytes(user["password_hash"]))
+                if ok and hash_rounds(user["password_hash"]) < BCRYPT_ROUNDS:
+                    update_password_hash(email, self._run(_hash, pw, BCRYPT_ROUNDS))
+        finally:
+            self._slots.release()
+            self._latencies.append(time.perf_counter() - start)
+        if not ok:
+            self.accounts.fail(email)
+            self.ips.fail(ip)
+            return None, "Invalid credentials"
+        self.accounts.reset(email)
+        return user, None
+
+    def latency_percentiles(self, percentiles=(50, 95, 99)):
+        """Verification latency in milliseconds over the last LATENCY_SAMPLES logins, keyed p50/p95/p99."""
+        samples = np.fromiter(self._latencies, dtype="float64")
+        if not len(samples):
+            return {f"p{p}": None for p in percentiles}
+        return {f"p{p}": float(v) * 1000 for p, v in zip(percentiles, np.percentile(samples, percentiles))}
+
+    def close(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(cancel_futures=True)
+                self._pool = None
+
+LOGIN_SERVICE = LoginService()
@@ -1,21 +1,98 @@
+import os, copy, json, hashlib, itertools, logging, math, multiprocessing, time, uuid, threading
+from contextlib import contextmanager
 import numpy as np, pandas as pd
+import joblib
+from joblib import Parallel, delayed
+from threadpoolctl import threadpool_limits
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
-from sklearn.linear_model import LinearRegression
+from sklearn.linear_model import LinearRegression, Ridge, Lasso, SGDRegressor
+from sklearn.preprocessing import StandardScaler
 from sklearn.ensemble import RandomForestRegressor
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait
+from joblib.externals.loky import ProcessPoolExecutor as LokyExecutor
+from data_utils import CHUNK_ROWS, apply_schema, chunk_schema, evict_lru, infer_schema, iter_chunks, widen_schema
 
-def train_models(df, target, features):
+log = logging.getLogger(__name__)
+
+MODEL_CACHE_DIR = os.path.join(os.path.dirname(__file__), ".model_cache")
+MODEL_CACHE_MAX_BYTES = 2 * 1024 ** 3
+RF_PARAMS = {"n_estimators": 100, "random_state": 42}
+SPLIT_PARAMS = {"test_size": 0.2, "random_state": 42}
+
+def dataset_fingerprint(df, columns=None):
+    """Content hash of the given columns (names, dtypes and values), stable across sessions."""
+    frame = df if columns is None else df[list(columns)]
+    h = hashlib.blake2b(digest_size=20)
+    h.update(json.dumps([[str(c), str(t)] for c, t in frame.dtypes.items()]).encode())
+    h.update(pd.util.hash_pandas_object(frame, index=False).to_numpy().tobytes())
+    return h.hexdigest()
+
+def _cache_path(cache_dir, fingerprint, target, features):
+    spec = {"data": fingerprint, "target": target, "features": list(features),
+            "rf": RF_PARAMS, "split": SPLIT_PARAMS}
+    key = hashlib.blake2b(json.dumps(spec, sort_keys=True, default=str).encode(), digest_size=20).hexdigest()
+    return os.path.join(cache_dir, f"{key}.joblib")
+
+class CoreBudget:
+    """Process-wide pool of CPU cores that training sessions borrow from, so one user cannot take them all."""
+
+    def __init__(self, total):
+        self.total = max(1, total)
+        self.free = self.total
+        self._cond = threading.Condition()
+
+    @contextmanager
+    def borrow(self, n):
+        n = max(1, min(n, self.total))
+        with self._cond:
+            self._cond.wait_for(lambda: self.free >= n)
+            self.free -= n
+        try:
+            yield n
+        finally:
+            with self._cond:
+                self.free += n
+                self._cond.notify_all()
+
+CORES = CoreBudget(os.cpu_count() or 1)
+SESSION_CPU_BUDGET = int(os.environ.get("DD_TRAIN_CPUS", max(1, CORES.total // 2)))
+
+def _metrics(y_true, y_pred):
+    return {"MAE": float(mean_absolute_error(y_true, y_pred)),
+            "RMSE": float(math.sqrt(mean_squared_error(y_true, y_pred))),
+            "R2": float(r2_score(y_true, y_pred))}
+
+def _fit_one(name, X_train, y_train, X_test, n_jobs):
+    with threadpool_limits(limits=n_jobs):
+        if name == "Random Forest":
+            model = RandomForestRegressor(**RF_PARAMS, n_jobs=n_jobs)
+        else:
+            model = LinearRegression()
+        model.fit(X_train, y_train)
+        return name, model, model.predict(X_test)
+
+def _fit_models(df, target, features, cpu_budget=None):
     X = df[features].copy()
     y = df[target].copy()
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-    lr = LinearRegression(); lr.fit(X_train, y_train); lr_pred = lr.predict(X_test)
-    rf = RandomForestRegressor(random_state=42, n_estimators=100); rf.fit(X_train, y_train); rf_pred = rf.predict(X_test)
-    def metrics(y_true, y_pred):
-        import math
-        return {"MAE": float(mean_absolute_error(y_true, y_pred)),
-                "RMSE": float(math.sqrt(mean_squared_error(y_true, y_pred))),
-                "R2": float(r2_score(y_true, y_pred))}
-    results = {"Linear Regression": metrics(y_test, lr_pred), "Random Forest": metrics(y_test, rf_pred)}
+    X_train, X_test, y_train, y_test = train_test_split(X, y, **SPLIT_PARAMS)
+    return _fit_and_score(X_train, y_train, X_test, y_test, features, cpu_budget)
+
+def _fit_and_score(X_train, y_train, X_test, y_test, features, cpu_budget=None):
+    with CORES.borrow(cpu_budget or SESSION_CPU_BUDGET) as cores:
+        if cores > 1:
+            # the linear model needs one core; the forest gets the rest of the session's budget
+            jobs = [("Linear Regression", 1), ("Random Forest", max(1, cores - 1))]
+            fitted = Parallel(n_jobs=2, backend="loky")(
+                delayed(_fit_one)(name, X_train, y_train, X_test, n) for name, n in jobs)
+        else:
+            fitted = [_fit_one(name, X_train, y_train, X_test, 1) for name in ("Linear Regression", "Random Forest")]
+    models = {name: model for name, model, _ in fitted}
+    preds = {name: pred for name, _, pred in fitted}
+    lr, rf = models["Linear Regression"], models["Random Forest"]
+    lr_pred, rf_pred = preds["Linear Regression"], preds["Random Forest"]
+    results = {"Linear Regression": _metrics(y_test, lr_pred), "Random Forest": _metrics(y_test, rf_pred)}
     importances = None
     try:
         importances = dict(zip(features, rf.feature_importances_.tolist()))
@@ -24,3 +101,348 @@ def train_models(df, target, features):
     best_model = "Random Forest" if results["Random Forest"]["RMSE"] <= results["Linear Regression"]["RMSE"] else "Linear Regression"
     model_obj = rf if best_model == "Random Forest" else lr
     return {"results": results, "best_model_name": best_model, "best_model": model_obj, "importances": importances}
+
+def train_models(df, target, features, cache=True, dataset_key=None, cpu_budget=None,
+                 cache_dir=MODEL_CACHE_DIR, max_bytes=MODEL_CACHE_MAX_BYTES):
+    """
+    Fit the candidate models side by side in worker processes and pick the best by RMSE.
+    `cpu_budget` caps the cores this call may use (SESSION_CPU_BUDGET by default); calls
+    wait for cores from the shared CORES pool, so concurrent sessions cannot oversubscribe the host.
+    Results are cached on disk keyed on the data, target, features and hyperparameters;
+    pass `dataset_key` (e.g. the upload hash from data_utils.load_dataset) to skip hashing the frame.
+    """
+    if not cache:
+        return _fit_models(df, target, features, cpu_budget)
+    fingerprint = dataset_key or dataset_fingerprint(df, [target, *features])
+    path = _cache_path(cache_dir, fingerprint, target, features)
+    if os.path.exists(path):
+        try:
+            out = joblib.load(path)
+            os.utime(path)
+            return out
+        except Exception:
+            pass
+    out = _fit_models(df, target, features, cpu_budget)
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        joblib.dump(out, tmp)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    evict_lru(cache_dir, max_bytes, ".joblib", keep=path)
+    return out
+
+def _stratified_sample(X, y, n, seed):
+    if n >= len(y):
+        return X, y
+    bins = pd.qcut(y.rank(method="first"), q=min(10, n), labels=False)
+    idx = (pd.Series(np.arange(len(y)), index=y.index).groupby(bins.to_numpy())
+           .sample(frac=n / len(y), random_state=seed).to_numpy())
+    return X.iloc[idx], y.iloc[idx]
+
+def train_progressive(df, target, features, time_budget=30.0, start_rows=10_000, growth=4,
+                      tol=0.01, date_col=None, max_val_rows=100_000, cpu_budget=None, seed=42):
+    """
+    Train on growing samples and yield provisional train_models-style results after each round,
+    with "rows", "elapsed" and "final" added. Samples are stratified on the target, or the most
+    recent rows when `date_col` is given (validation is then the latest 20%). Stops once the full
+    training split is used, the next round would overrun `time_budget` seconds, or the best
+    validation RMSE improves by less than `tol` (relative).
+    """
+    started = time.perf_counter()
+    if date_col:
+        ordered = df.sort_values(date_col)
+        cut = int(len(ordered) * (1 - SPLIT_PARAMS["test_size"]))
+        train, test = ordered.iloc[:cut], ordered.iloc[cut:]
+        if len(test) > max_val_rows:
+            test = test.iloc[-max_val_rows:]
+        X_train, y_train = train[features], train[target]
+        X_test, y_test = test[features], test[target]
+    else:
+        X_train, X_test, y_train, y_test = train_test_split(df[features], df[target], **SPLIT_PARAMS)
+        if len(y_test) > max_val_rows:
+            X_test, y_test = X_test.iloc[:max_val_rows], y_test.iloc[:max_val_rows]
+    n, best_rmse = min(start_rows, len(y_train)), None
+    while True:
+        if date_col:
+            X_s, y_s = X_train.iloc[-n:], y_train.iloc[-n:]
+        else:
+            X_s, y_s = _stratified_sample(X_train, y_train, n, seed)
+        round_start = time.perf_counter()
+        out = _fit_and_score(X_s, y_s, X_test, y_test, features, cpu_budget)
+        now = time.perf_counter()
+        rmse = out["results"][out["best_model_name"]]["RMSE"]
+        improved = best_rmse is None or rmse < best_rmse * (1 - tol)
+        best_rmse = rmse if best_rmse is None else min(best_rmse, rmse)
+        next_n = min(n * growth, len(y_train))
+        overrun = (now - started) + (now - round_start) * next_n / n > time_budget
+        final = n >= len(y_train) or overrun or not improved
+        yield {**out, "rows": n, "elapsed": now - started, "final": final}
+        if final:
+            return
+        n = next_n
+
+TUNING_SPACE = [
+    ("Linear Regression", LinearRegression, {}),
+    ("Ridge", Ridge, {"alpha": [0.1, 1.0, 10.0, 100.0]}),
+    ("Lasso", Lasso, {"alpha": [0.001, 0.01, 0.1, 1.0]}),
+    ("Random Forest", RandomForestRegressor, {"max_depth": [None, 8, 16], "n_estimators": [50, 100, 200]}),
+]
+
+def _candidates(space, seed):
+    out = []
+    for family, cls, grid in space:
+        keys = sorted(grid)
+        for values in itertools.product(*(grid[k] for k in keys)):
+            params = dict(zip(keys, values))
+            if cls is RandomForestRegressor:
+                params["random_state"] = seed
+            label = family + (" (" + ", ".join(f"{k}={v}" for k, v in params.items() if k != "random_state") + ")" if grid else "")
+            out.append((label, cls, params))
+    return out
+
+def _fit_trial(label, cls, params, X_train, y_train, X_test, y_test):
+    start = time.perf_counter()
+    with threadpool_limits(limits=1):
+        model = cls(**params).fit(X_train, y_train)
+        pred = model.predict(X_test)
+    return label, model, _metrics(y_test, pred), time.perf_counter() - start
+
+def _record_rung(fitted, rung, rows, started, results, models, trace):
+    elapsed = time.perf_counter() - started
+    for label, model, m, seconds in fitted:
+        results[label], models[label] = m, model
+        trace.append({"trial": label, "rung": rung, "rows": rows, "seconds": seconds,
+                      "elapsed": elapsed, "RMSE": m["RMSE"]})
+        log.info("tune %s rung=%d rows=%d fit=%.2fs elapsed=%.2fs RMSE=%.4f",
+                 label, rung, rows, seconds, elapsed, m["RMSE"])
+
+def tune_models(df, target, features, time_budget=120.0, eta=3, min_rows=2_000,
+                space=TUNING_SPACE, cpu_budget=None, seed=42):
+    """
+    Successive-halving search over TUNING_SPACE: every candidate starts on a small sample,
+    the best 1/eta move on to eta times more rows, and the last rung uses the full training split.
+    Rungs run in a loky process pool within `cpu_budget` cores; at `time_budget` seconds the running
+    rung is killed and the best trial of the last rung reached (counting only its finished trials) wins.
+    Returns the train_models shape (results per surviving candidate at its last rung) plus "trace",
+    one entry per trial with rung, rows, fit seconds, elapsed seconds and RMSE.
+    """
+    started = time.perf_counter()
+    X_train, X_test, y_train, y_test = train_test_split(df[features], df[target], **SPLIT_PARAMS)
+    alive = _candidates(space, seed)
+    rungs = max(1, math.ceil(math.log(len(alive), eta)) + 1)
+    rows = [max(min(min_rows, len(y_train)), int(len(y_train) / eta ** (rungs - 1 - r))) for r in range(rungs)]
+    results, models, trace = {}, {}, []
+    with CORES.borrow(cpu_budget or SESSION_CPU_BUDGET) as cores:
+        # a private pool, even for one core, so trials can be killed when the budget runs out
+        pool = LokyExecutor(max_workers=cores)
+        try:
+            for rung, n in enumerate(rows):
+                remaining = time_budget - (time.perf_counter() - started)
+                if remaining <= 0:
+                    break
+                X_s, y_s = _stratified_sample(X_train, y_train, n, seed)
+                futures = [pool.submit(_fit_trial, label, cls, params, X_s, y_s, X_test, y_test)
+                           for label, cls, params in alive]
+                _, pending = wait(futures, timeout=remaining)
+                fitted = [f.result() for f in futures if f not in pending]
+                _record_rung(fitted, rung, len(y_s), started, results, models, trace)
+                if pending:
+                    break
+                ranked = sorted(fitted, key=lambda f: f[2]["RMSE"])
+                alive_labels = {f[0] for f in ranked[:max(1, len(ranked) // eta)]}
+                alive = [c for c in alive if c[0] in alive_labels]
+        finally:
+            pool.shutdown(wait=False, kill_workers=True)
+    if not results:
+        raise TimeoutError("time_budget ran out before any trial finished")
+    last_rung = {t["trial"] for t in trace if t["rung"] == trace[-1]["rung"]}
+    best = min(last_rung, key=lambda label: results[label]["RMSE"])
+    importances = None
+    try:
+        importances = dict(zip(features, models[best].feature_importances_.tolist()))
+    except Exception:
+        pass
+    return {"results": results, "best_model_name": best, "best_model": models[best],
+            "importances": importances, "trace": trace}
+
+def save_model(path, model, features, schema=None, target=None, state=None):
+    """
+    Write a scoring bundle: the fitted estimator, its feature list and the ETL schema it was trained with.
+    `state` carries extra training state, such as the incremental models and rolling holdout.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    joblib.dump({"model": model, "features": list(features), "schema": schema, "target": target,
+                 "state": state}, path)
+
+_worker_bundle = None
+
+def _init_scorer(model_path):
+    global _worker_bundle
+    _worker_bundle = joblib.load(model_path, mmap_mode="r")
+
+def _score_chunk(chunk, schema, bundle=None):
+    bundle = bundle or _worker_bundle
+    chunk = apply_schema(chunk, schema, workers=1)
+    chunk["prediction"] = bundle["model"].predict(chunk[bundle["features"]])
+    return chunk
+
+def _iter_input(in_path, chunksize):
+    if str(in_path).lower().endswith(".parquet"):
+        import pyarrow.parquet as pq
+        pf = pq.ParquetFile(in_path)
+        total, done = pf.metadata.num_rows, 0
+        for batch in pf.iter_batches(batch_size=chunksize):
+            done += batch.num_rows
+            yield batch.to_pandas(), done / max(total, 1)
+    else:
+        yield from iter_chunks(in_path, chunksize)
+
+class _ChunkWriter:
+    def __init__(self, out_path):
+        self.out_path, self.writer, self.schema, self.rows = out_path, None, None, 0
+        self.path = out_path
+        self.parquet = str(out_path).lower().endswith(".parquet")
+
+    def _widen(self, schema):
+        # Parquet files have one schema, so copy the row groups written so far into a file with the wider one
+        import pyarrow as pa, pyarrow.parquet as pq
+        self.writer.close()
+        old, self.path, self.schema = self.path, f"{self.out_path}.{uuid.uuid4().hex}.tmp", schema
+        self.writer = pq.ParquetWriter(self.path, schema)
+        for batch in pq.ParquetFile(old).iter_batches():
+            self.writer.write_table(pa.Table.from_batches([batch]).cast(schema, safe=False))
+        if old != self.out_path:
+            os.remove(old)
+
+    def write(self, chunk):
+        if self.parquet:
+            import pyarrow as pa, pyarrow.parquet as pq
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if self.writer is None:
+                self.schema = chunk_schema(table)
+                self.writer = pq.ParquetWriter(self.path, self.schema)
+            wider = widen_schema(self.schema, table)
+            if wider is not None:
+                self._widen(wider)
+            self.writer.write_table(table.cast(self.schema, safe=False))
+        else:
+            chunk.to_csv(self.out_path, mode="w" if self.rows == 0 else "a", header=self.rows == 0, index=False)
+        self.rows += len(chunk)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            if self.path != self.out_path:
+                os.replace(self.path, self.out_path)
+
+def score_file(model_path, in_path, out_path, chunksize=CHUNK_ROWS, workers=1, on_progress=None):
+    """
+    Score a CSV/Excel/Parquet file with a bundle from save_model, chunk by chunk, applying the
+    training ETL schema and streaming rows plus a `prediction` column to CSV or Parquet.
+    With workers > 1 chunks are scored in a process pool (at most 2 chunks in flight per worker)
+    and written in input order. Returns the number of rows written.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+    out = _ChunkWriter(out_path)
+    bundle = joblib.load(model_path, mmap_mode="r")
+    schema = bundle["schema"]
+    # spawn: forking the multi-threaded Streamlit server is unsafe
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                               initializer=_init_scorer, initargs=(model_path,)) if workers > 1 else None
+    pending = deque()
+
+    def drain(limit):
+        while len(pending) > limit or (pending and pending[0][0].done()):
+            future, progress = pending.popleft()
+            out.write(future.result())
+            if on_progress and progress is not None:
+                on_progress(progress)
+
+    try:
+        for chunk, progress in _iter_input(in_path, chunksize):
+            if schema is None:
+                schema = infer_schema(chunk)
+            if pool is None:
+                out.write(_score_chunk(chunk, schema, bundle))
+                if on_progress and progress is not None:
+                    on_progress(progress)
+            else:
+                pending.append((pool.submit(_score_chunk, chunk, schema), progress))
+                drain(2 * workers - 1)
+        drain(0)
+        return out.rows
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+        out.close()
+
+HOLDOUT_ROWS = 5_000
+UPDATE_TREES = 20
+MAX_TREES = 300
+
+class IncrementalLinear:
+    """SGD linear regression on running-standardized features and target, updatable with partial_fit."""
+
+    def __init__(self, seed=42):
+        self.x_scaler, self.y_scaler = StandardScaler(), StandardScaler()
+        self.sgd = SGDRegressor(random_state=seed)
+
+    def partial_fit(self, X, y, epochs=1):
+        X, y = np.asarray(X, dtype="float64"), np.asarray(y, dtype="float64").reshape(-1, 1)
+        self.x_scaler.partial_fit(X)
+        self.y_scaler.partial_fit(y)
+        Xs, ys = self.x_scaler.transform(X), self.y_scaler.transform(y).ravel()
+        for _ in range(epochs):
+            self.sgd.partial_fit(Xs, ys)
+        return self
+
+    def predict(self, X):
+        pred = self.sgd.predict(self.x_scaler.transform(np.asarray(X, dtype="float64")))
+        return self.y_scaler.inverse_transform(pred.reshape(-1, 1)).ravel()
+
+def _incremental_result(models, holdout, target, features):
+    X, y = holdout[features], holdout[target]
+    results = {name: _metrics(y, model.predict(X)) for name, model in models.items()}
+    best = min(results, key=lambda name: results[name]["RMSE"])
+    importances = dict(zip(features, models["Random Forest"].feature_importances_.tolist()))
+    return {"results": results, "best_model_name": best, "best_model": models[best], "importances": importances,
+            "state": {"models": models, "holdout": holdout}}
+
+def train_incremental(df, target, features, holdout_rows=HOLDOUT_ROWS, epochs=5):
+    """
+    Train update-friendly candidates: an SGD linear model and a warm-start forest.
+    The last `holdout_rows` rows (in upload order) form the rolling holdout used for metrics.
+    Returns the train_models shape plus "state" for update_incremental.
+    """
+    data = df[[*features, target]]
+    train, holdout = data.iloc[:-holdout_rows], data.iloc[-holdout_rows:]
+    if train.empty:
+        train, holdout = train_test_split(data, **SPLIT_PARAMS)
+    lr = IncrementalLinear().partial_fit(train[features], train[target], epochs)
+    rf = RandomForestRegressor(**RF_PARAMS, warm_start=True).fit(train[features], train[target])
+    return _incremental_result({"Linear Regression": lr, "Random Forest": rf}, holdout, target, features)
+
+def update_incremental(state, new_df, target, features, holdout_rows=HOLDOUT_ROWS,
+                       trees=UPDATE_TREES, max_trees=MAX_TREES, epochs=1):
+    """
+    Update the models in `state` (from train_incremental or a previous update) with appended rows only.
+    The newest rows join the rolling holdout; the rows it pushes out, plus the rest of the delta,
+    are used for partial_fit on the linear model and `trees` extra warm-start trees on the forest
+    (keeping at most `max_trees`). Cost follows the size of the delta, not the history.
+    """
+    models = {name: copy.deepcopy(m) for name, m in state["models"].items()}
+    combined = pd.concat([state["holdout"], new_df[[*features, target]]])
+    fresh = combined.iloc[:-holdout_rows] if len(combined) > holdout_rows else combined.iloc[:0]
+    holdout = combined.iloc[-holdout_rows:]
+    if not fresh.empty:
+        models["Linear Regression"].partial_fit(fresh[features], fresh[target], epochs)
+        rf = models["Random Forest"]
+        rf.n_estimators += trees
+        rf.fit(fresh[features], fresh[target])
+        if len(rf.estimators_) > max_trees:
+            rf.estimators_ = rf.estimators_[-max_trees:]
+            rf.n_estimators = max_trees
+    return _incremental_result(models, holdout, target, features)
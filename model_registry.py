@@ -0,0 +1,134 @@
+import os, json, hashlib, time, uuid, threading
+from collections import OrderedDict
+import joblib
+from db import connection, init_db, log_event
+from ml_utils import dataset_fingerprint, save_model, train_incremental, train_models, update_incremental
+
+MODEL_DIR = os.path.join(os.path.dirname(__file__), "models")
+WARM_MODELS = 8
+
+_ready = False
+_warm = OrderedDict()
+_warm_lock = threading.Lock()
+
+def _ensure_db():
+    global _ready
+    if not _ready:
+        init_db()
+        _ready = True
+
+def _row(r):
+    if r is None:
+        return None
+    d = dict(r)
+    d["features"] = json.loads(d["features"])
+    d["metrics"] = json.loads(d["metrics"]) if d["metrics"] else None
+    return d
+
+def register_model(model, dataset_hash, target, features, model_name=None, metrics=None,
+                   train_seconds=None, schema=None, state=None):
+    """Write the model as a scoring bundle under MODEL_DIR and record it in app.db. Returns the new id."""
+    _ensure_db()
+    path = os.path.join(MODEL_DIR, f"{uuid.uuid4().hex}.joblib")
+    save_model(path, model, features, schema, target, state)
+    with connection() as conn:
+        cur = conn.execute("""INSERT INTO models (dataset_hash, target, features, model_name, metrics, train_seconds, artifact_path)
+                              VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                           (dataset_hash, target, json.dumps(list(features)), model_name,
+                            json.dumps(metrics) if metrics is not None else None, train_seconds, path))
+    log_event("train", model_id=cur.lastrowid, model_name=model_name, target=target, seconds=train_seconds)
+    return cur.lastrowid
+
+def get_model(model_id):
+    _ensure_db()
+    with connection() as conn:
+        return _row(conn.execute("SELECT * FROM models WHERE id=?", (model_id,)).fetchone())
+
+def find_model(dataset_hash, target, features):
+    """Most recent registry entry for this dataset, target and feature list, or None."""
+    _ensure_db()
+    with connection() as conn:
+        row = conn.execute("SELECT * FROM models WHERE dataset_hash=? AND target=? AND features=? ORDER BY id DESC LIMIT 1",
+                           (dataset_hash, target, json.dumps(list(features)))).fetchone()
+    return _row(row)
+
+def list_models():
+    _ensure_db()
+    with connection() as conn:
+        return [_row(r) for r in conn.execute("SELECT * FROM models ORDER BY id DESC").fetchall()]
+
+def load_model(model_id):
+    """
+    Return the bundle (model, features, schema, target) for a registry id. Artifacts are loaded
+    lazily with joblib memory-mapping and the WARM_MODELS most recently used stay in memory.
+    """
+    with _warm_lock:
+        if model_id in _warm:
+            _warm.move_to_end(model_id)
+            bundle = _warm[model_id]
+        else:
+            bundle = None
+    entry = get_model(model_id) if bundle is None else None
+    if bundle is None:
+        if entry is None:
+            raise KeyError(f"No registered model with id {model_id}")
+        bundle = joblib.load(entry["artifact_path"], mmap_mode="r")
+        with _warm_lock:
+            _warm[model_id] = bundle
+            _warm.move_to_end(model_id)
+            while len(_warm) > WARM_MODELS:
+                _warm.popitem(last=False)
+    with connection() as conn:
+        conn.execute("UPDATE models SET hits = hits + 1, last_used_at = CURRENT_TIMESTAMP WHERE id=?", (model_id,))
+    return bundle
+
+def train_or_load(df, target, features, dataset_key=None, schema=None):
+    """
+    train_models backed by the registry: reuse the registered best model for this dataset,
+    target and features if there is one, otherwise train and register it.
+    Returns the train_models shape plus "model_id".
+    """
+    dataset_hash = dataset_key or dataset_fingerprint(df, [target, *features])
+    entry = find_model(dataset_hash, target, features)
+    if entry is not None and os.path.exists(entry["artifact_path"]):
+        bundle = load_model(entry["id"])
+        log_event("model_reuse", model_id=entry["id"], model_name=entry["model_name"], target=target)
+        return {"results": entry["metrics"]["results"], "best_model_name": entry["model_name"],
+                "best_model": bundle["model"], "importances": entry["metrics"].get("importances"),
+                "model_id": entry["id"]}
+    start = time.perf_counter()
+    out = train_models(df, target, features, dataset_key=dataset_hash)
+    model_id = register_model(out["best_model"], dataset_hash, target, features, out["best_model_name"],
+                              {"results": out["results"], "importances": out["importances"]},
+                              time.perf_counter() - start, schema)
+    return {**out, "model_id": model_id}
+
+def _register_result(out, dataset_hash, target, features, seconds, schema):
+    return register_model(out["best_model"], dataset_hash, target, features, out["best_model_name"],
+                          {"results": out["results"], "importances": out["importances"]},
+                          seconds, schema, out["state"])
+
+def register_incremental(df, target, features, dataset_key=None, schema=None):
+    """Train with ml_utils.train_incremental and register the result with its update state. Returns the id."""
+    dataset_hash = dataset_key or dataset_fingerprint(df, [target, *features])
+    start = time.perf_counter()
+    out = train_incremental(df, target, features)
+    return _register_result(out, dataset_hash, target, features, time.perf_counter() - start, schema)
+
+def update_model(model_id, new_df):
+    """
+    Apply appended rows to an incrementally trained registry model and register the result as a
+    new entry whose dataset hash chains the parent hash with the delta. Returns the new id.
+    """
+    entry = get_model(model_id)
+    if entry is None:
+        raise KeyError(f"No registered model with id {model_id}")
+    bundle = joblib.load(entry["artifact_path"])
+    if not bundle.get("state"):
+        raise ValueError(f"Model {model_id} was not trained with train_incremental and cannot be updated.")
+    target, features = entry["target"], entry["features"]
+    start = time.perf_counter()
+    out = update_incremental(bundle["state"], new_df, target, features)
+    delta_hash = dataset_fingerprint(new_df, [target, *features])
+    chained = hashlib.blake2b(f"{entry['dataset_hash']}+{delta_hash}".encode(), digest_size=20).hexdigest()
+    return _register_result(out, chained, target, features, time.perf_counter() - start, bundle["schema"])
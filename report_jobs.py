@@ -0,0 +1,88 @@
+import os, json, hashlib, uuid, threading
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+from data_utils import evict_lru
+from db import connection, init_db, log_event
+from report_utils import IMAGE_CACHE, build_report_pdf
+
+REPORT_DIR = os.path.join(os.path.dirname(__file__), "reports")
+REPORT_MAX_BYTES = 256 * 1024 ** 2
+REPORT_WORKERS = 2
+
+_executor = ThreadPoolExecutor(max_workers=REPORT_WORKERS, thread_name_prefix="report-job")
+_payloads = {}
+_lock = threading.Lock()
+_ready = False
+
+def _ensure_db():
+    global _ready
+    if _ready:
+        return
+    init_db()
+    # jobs left queued/running by a previous process lost their in-memory inputs
+    with connection() as conn:
+        conn.execute("""UPDATE report_jobs SET status='failed', error='Interrupted by a server restart',
+                        updated_at=CURRENT_TIMESTAMP WHERE status IN ('queued', 'running')""")
+    _ready = True
+
+def _update(job_id, **fields):
+    sets = ", ".join(f"{k}=?" for k in fields)
+    with connection() as conn:
+        conn.execute(f"UPDATE report_jobs SET {sets}, updated_at=CURRENT_TIMESTAMP WHERE id=?", (*fields.values(), job_id))
+
+def _job_key(df, fig, params, dataset_key):
+    dataset_key = dataset_key or hashlib.blake2b(
+        pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes(), digest_size=20).hexdigest()
+    figure_key = IMAGE_CACHE.key(fig, "png", 700, 500)
+    spec = json.dumps({"params": params, "data": dataset_key, "figure": figure_key}, sort_keys=True, default=str)
+    return hashlib.blake2b(spec.encode(), digest_size=20).hexdigest()
+
+def _run(job_id):
+    df, fig, params = _payloads[job_id]
+    try:
+        _update(job_id, status="running", progress=0.05)
+        pdf = build_report_pdf(df, fig, params["numeric_cols"], params["title"], params["author"],
+                               progress=lambda fraction: _update(job_id, progress=fraction))
+        os.makedirs(REPORT_DIR, exist_ok=True)
+        path = os.path.join(REPORT_DIR, f"{job_id}.pdf")
+        with open(path, "wb") as f:
+            f.write(pdf)
+        # finished PDFs are only read back once by the page that asked for them
+        evict_lru(REPORT_DIR, REPORT_MAX_BYTES, ".pdf", keep=path)
+        _update(job_id, status="done", progress=1.0, result_path=path)
+    except Exception as e:
+        _update(job_id, status="failed", error=str(e))
+    finally:
+        _payloads.pop(job_id, None)
+
+def submit_report(df, fig, params, owner_email=None, dataset_key=None):
+    """
+    Queue a PDF report for `df` and `fig` (params: numeric_cols, title, author, plus any chart settings).
+    A request identical to one of the same user's queued or running jobs (same data, figure and params)
+    returns that job's id instead of starting another; finished jobs are not reused, so every report
+    carries its own generation time. Returns the job id.
+    """
+    _ensure_db()
+    params = {**params, "numeric_cols": list(params["numeric_cols"])}
+    key = _job_key(df, fig, params, dataset_key)
+    with _lock, connection() as conn:
+        row = conn.execute("""SELECT id FROM report_jobs
+                              WHERE job_key=? AND owner_email IS ? AND status IN ('queued', 'running')
+                              ORDER BY created_at DESC LIMIT 1""", (key, owner_email)).fetchone()
+        if row:
+            log_event("export", owner_email, job_id=row["id"], reused=True)
+            return row["id"]
+        job_id = uuid.uuid4().hex
+        conn.execute("INSERT INTO report_jobs (id, job_key, params, owner_email) VALUES (?, ?, ?, ?)",
+                     (job_id, key, json.dumps(params, default=str), owner_email))
+        _payloads[job_id] = (df, fig, params)
+    log_event("export", owner_email, job_id=job_id, reused=False, title=params.get("title"))
+    _executor.submit(_run, job_id)
+    return job_id
+
+def job_status(job_id):
+    """The job's row as a dict (status is one of queued/running/done/failed), or None."""
+    _ensure_db()
+    with connection() as conn:
+        row = conn.execute("SELECT * FROM report_jobs WHERE id=?", (job_id,)).fetchone()
+    return dict(row) if row else None
@@ -1,10 +1,166 @@
 # file: report_utils.py
 import os
-import tempfile
+import asyncio
+import atexit
+import threading
+import hashlib
+import uuid
+from collections import OrderedDict
+from io import BytesIO
+from datetime import datetime
 from reportlab.lib.pagesizes import A4
 from reportlab.pdfgen import canvas
 from reportlab.lib.utils import ImageReader
 import plotly.io as pio
+from data_utils import evict_lru
+
+RENDER_TABS = 4
+RENDER_WIDTH, RENDER_HEIGHT = 1200, 800
+
+class _ChartRenderer:
+    """
+    One long-lived Kaleido browser with RENDER_TABS tabs, driven from a background event loop
+    so Streamlit threads can hand it figures and several render at once.
+    """
+
+    def __init__(self, tabs):
+        self.tabs = tabs
+        self._loop = None
+        self._kaleido = None
+        self._lock = threading.Lock()
+
+    def _start(self):
+        import kaleido
+        loop = asyncio.new_event_loop()
+        threading.Thread(target=loop.run_forever, daemon=True, name="kaleido-renderer").start()
+
+        async def open_browser():
+            k = kaleido.Kaleido(n=self.tabs)
+            await k.__aenter__()
+            return k
+
+        try:
+            self._kaleido = asyncio.run_coroutine_threadsafe(open_browser(), loop).result()
+        except Exception:
+            loop.call_soon_threadsafe(loop.stop)
+            raise
+        self._loop = loop
+        atexit.register(self.close)
+
+    def render(self, figs, fmt, width, height):
+        with self._lock:
+            if self._loop is None:
+                self._start()
+        opts = {"format": fmt, "width": width, "height": height}
+
+        async def render_all():
+            return await asyncio.gather(*(self._kaleido.calc_fig(fig, opts=dict(opts)) for fig in figs))
+
+        return asyncio.run_coroutine_threadsafe(render_all(), self._loop).result()
+
+    def close(self):
+        with self._lock:
+            if self._loop is None:
+                return
+            asyncio.run_coroutine_threadsafe(self._kaleido.__aexit__(None, None, None), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._loop, self._kaleido = None, None
+
+_renderer = _ChartRenderer(RENDER_TABS)
+
+class ImageCache:
+    """
+    Rendered chart bytes keyed on a hash of the figure spec, render size and format.
+    An in-memory LRU bounded by total bytes, with an optional on-disk tier in `disk_dir`.
+    """
+
+    def __init__(self, max_bytes, disk_dir=None, disk_max_bytes=None):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self.size = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(fig, fmt, width, height):
+        spec = fig if isinstance(fig, dict) else fig.to_plotly_json()
+        payload = pio.to_json({"spec": spec, "fmt": fmt, "width": width, "height": height}, validate=False)
+        return hashlib.blake2b(payload.encode(), digest_size=20).hexdigest()
+
+    def _disk_path(self, key, fmt):
+        return os.path.join(self.disk_dir, f"{key}.{fmt}")
+
+    def get(self, key, fmt):
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                return self._items[key]
+        if self.disk_dir:
+            path = self._disk_path(key, fmt)
+            try:
+                with open(path, "rb") as f:
+                    data = f.read()
+                os.utime(path)
+            except FileNotFoundError:
+                return None
+            self._remember(key, data)
+            return data
+        return None
+
+    def _remember(self, key, data):
+        with self._lock:
+            if key in self._items:
+                self.size -= len(self._items.pop(key))
+            if len(data) > self.max_bytes:
+                return
+            self._items[key] = data
+            self.size += len(data)
+            while self.size > self.max_bytes:
+                _, old = self._items.popitem(last=False)
+                self.size -= len(old)
+
+    def put(self, key, fmt, data):
+        self._remember(key, data)
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            path = self._disk_path(key, fmt)
+            tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+            if self.disk_max_bytes:
+                evict_lru(self.disk_dir, self.disk_max_bytes, f".{fmt}", keep=path)
+
+IMAGE_CACHE = ImageCache(max_bytes=64 * 1024 ** 2,
+                         disk_dir=os.path.join(os.path.dirname(__file__), ".image_cache"),
+                         disk_max_bytes=512 * 1024 ** 2)
+
+def _render_uncached(figs, fmt, width, height):
+    try:
+        return _renderer.render(figs, fmt, width, height)
+    except (ImportError, AttributeError):
+        return [pio.to_image(fig, format=fmt, width=width, height=height) for fig in figs]
+
+def render_figures(figs, fmt="png", width=RENDER_WIDTH, height=RENDER_HEIGHT, cache=IMAGE_CACHE):
+    """
+    Render plotly figures to image bytes in memory, concurrently across the shared Kaleido tabs.
+    Figures already in `cache` (same spec, size and format) are not rendered again; pass cache=None to bypass it.
+    Falls back to one-by-one pio.to_image when the Kaleido 1.x API is unavailable.
+    """
+    figs = list(figs)
+    if not figs:
+        return []
+    if cache is None:
+        return _render_uncached(figs, fmt, width, height)
+    keys = [cache.key(fig, fmt, width, height) for fig in figs]
+    images = [cache.get(key, fmt) for key in keys]
+    missing = [i for i, img in enumerate(images) if img is None]
+    if missing:
+        for i, img in zip(missing, _render_uncached([figs[i] for i in missing], fmt, width, height)):
+            cache.put(keys[i], fmt, img)
+            images[i] = img
+    return images
 
 def export_dashboard_to_pdf(path, title, figs, kpis=None):
     """
@@ -33,13 +189,9 @@ def export_dashboard_to_pdf(path, title, figs, kpis=None):
     # Go to next page for charts
     c.showPage()
 
-    # 🔹 Charts → 1 per page, full width
-    for i, fig in enumerate(figs, start=1):
-        with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as tmp:
-            img_path = tmp.name
-        pio.write_image(fig, img_path, format="png", width=1200, height=800)
-
-        chart = ImageReader(img_path)
+    # 🔹 Charts → 1 per page, full width (rendered together, in memory)
+    for png in render_figures(figs):
+        chart = ImageReader(BytesIO(png))
 
         # Fit image inside A4 with margins
         margin = 50
@@ -49,8 +201,75 @@ def export_dashboard_to_pdf(path, title, figs, kpis=None):
         c.drawImage(chart, margin, margin, img_width, img_height, preserveAspectRatio=True, mask='auto')
         c.showPage()
 
-        # Cleanup temp file
-        os.remove(img_path)
-
     # Save final PDF
     c.save()
+
+def build_report_pdf(df, fig, numeric_cols, title="MSME Business Intelligence Report",
+                     author="Developed by Small Enterprises", progress=None):
+    """
+    Build the single-chart report from the Reports page: header, chart, summary statistics and insights.
+    Returns the PDF bytes. `progress`, if given, is called with a fraction as the report is assembled.
+    """
+    progress = progress or (lambda fraction: None)
+
+    # Render chart to PNG bytes in memory
+    chart_png = render_figures([fig], width=700, height=500)[0]
+    progress(0.5)
+
+    # Create PDF buffer
+    buffer = BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=A4)
+    width, height = A4
+
+    # Header
+    pdf.setFont("Helvetica-Bold", 16)
+    pdf.drawString(50, height - 60, title)
+    pdf.setFont("Helvetica", 10)
+    pdf.drawString(50, height - 80, f"Generated on: {datetime.now().strftime('%d %B %Y, %I:%M %p')}")
+    pdf.drawString(50, height - 95, author)
+
+    # Add chart
+    img = ImageReader(BytesIO(chart_png))
+    pdf.drawImage(img, 50, height - 450, width=500, height=300, preserveAspectRatio=True)
+
+    # Add Summary Statistics
+    pdf.setFont("Helvetica-Bold", 12)
+    pdf.drawString(50, height - 480, "📊 Summary Statistics:")
+    pdf.setFont("Helvetica", 9)
+
+    summary = df[numeric_cols].describe().round(2).to_string()
+    y_pos = height - 495
+    for line in summary.split("\n"):
+        if y_pos < 80:
+            pdf.showPage()
+            y_pos = height - 60
+        pdf.drawString(50, y_pos, line)
+        y_pos -= 12
+    progress(0.8)
+
+    # Add Insights
+    y_pos -= 25
+    pdf.setFont("Helvetica-Bold", 12)
+    pdf.drawString(50, y_pos, "💡 Key Insights:")
+    y_pos -= 15
+    pdf.setFont("Helvetica", 9)
+
+    for col in numeric_cols:
+        avg = df[col].mean()
+        maxv = df[col].max()
+        minv = df[col].min()
+        line = f"- {col}: Avg = {avg:.2f}, Max = {maxv:.2f}, Min = {minv:.2f}"
+        if y_pos < 80:
+            pdf.showPage()
+            y_pos = height - 60
+        pdf.drawString(50, y_pos, line)
+        y_pos -= 12
+
+    # Footer
+    pdf.setFont("Helvetica-Oblique", 9)
+    pdf.drawString(50, 40, "Generated by MSME BI Dashboard | © 2025 Prince Arockyam")
+
+    pdf.showPage()
+    pdf.save()
+    progress(1.0)
+    return buffer.getvalue()
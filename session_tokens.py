@@ -0,0 +1,129 @@
+import os, time, hmac, hashlib, base64, secrets, threading
+from collections import OrderedDict
+from db import DB_PATH, init_db, create_session, get_session, delete_session, purge_expired_sessions
+
+SESSION_TTL = 12 * 3600
+CACHE_SIZE = 1_024
+# how long a looked-up user (and role) is trusted before the database is asked again
+CACHE_TTL = 30
+SECRET_PATH = os.path.join(os.path.dirname(DB_PATH), ".session_secret")
+
+_ready = False
+
+def _ensure_db():
+    global _ready
+    if not _ready:
+        init_db()
+        purge_expired_sessions(time.time())
+        _ready = True
+
+_secret_lock = threading.Lock()
+
+def _load_secret():
+    """DD_SESSION_SECRET if set, else a random key kept next to app.db so tokens survive restarts."""
+    if os.environ.get("DD_SESSION_SECRET"):
+        return os.environ["DD_SESSION_SECRET"].encode()
+    with _secret_lock:
+        try:
+            with open(SECRET_PATH, "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            pass
+        key = secrets.token_bytes(32)
+        tmp = f"{SECRET_PATH}.{secrets.token_hex(8)}.tmp"
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(key)
+        try:
+            # link publishes the whole file at once and fails if another process got there first
+            os.link(tmp, SECRET_PATH)
+        except FileExistsError:
+            with open(SECRET_PATH, "rb") as f:
+                key = f.read()
+        finally:
+            os.remove(tmp)
+        return key
+
+def _b64(raw):
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+class SessionStore:
+    """
+    Login sessions as `<id>.<expires>.<signature>` tokens, HMAC-SHA256 signed with a server secret
+    and recorded in the sessions table. Forged or expired tokens are rejected from the token alone;
+    valid ones resolve to their user through a small LRU cache, so the database is read at most
+    once per CACHE_TTL seconds per session and bcrypt is never involved. The short cache lifetime
+    means a deleted user or changed role takes effect within CACHE_TTL.
+    """
+
+    def __init__(self, secret=None, ttl=SESSION_TTL, cache_size=CACHE_SIZE, cache_ttl=CACHE_TTL):
+        self._secret = secret
+        self.ttl = ttl
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _sign(self, payload):
+        if self._secret is None:
+            self._secret = _load_secret()
+        return _b64(hmac.new(self._secret, payload.encode(), hashlib.sha256).digest())
+
+    def issue(self, user):
+        """New session token for `user` (a dict with email, name and role)."""
+        _ensure_db()
+        session_id = secrets.token_urlsafe(16)
+        expires = int(time.time() + self.ttl)
+        create_session(session_id, user["email"], expires)
+        self._remember(session_id, {"email": user["email"], "name": user["name"], "role": user["role"]})
+        payload = f"{session_id}.{expires}"
+        return f"{payload}.{self._sign(payload)}"
+
+    def _remember(self, session_id, user):
+        with self._lock:
+            self._cache[session_id] = (user, time.monotonic() + self.cache_ttl)
+            self._cache.move_to_end(session_id)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _parse(self, token):
+        try:
+            # tokens are ASCII; a non-ASCII cookie would make compare_digest raise TypeError
+            token.encode("ascii")
+            session_id, expires, signature = token.split(".")
+            expires = int(expires)
+        except (AttributeError, ValueError):
+            return None, None
+        if not hmac.compare_digest(signature, self._sign(f"{session_id}.{expires}")) or expires <= time.time():
+            return None, None
+        return session_id, expires
+
+    def validate(self, token):
+        """The user dict for a valid, unexpired, unrevoked token, else None."""
+        session_id, expires = self._parse(token)
+        if session_id is None:
+            return None
+        with self._lock:
+            hit = self._cache.get(session_id)
+            if hit is not None and hit[1] > time.monotonic():
+                self._cache.move_to_end(session_id)
+                return hit[0]
+            self._cache.pop(session_id, None)
+        _ensure_db()
+        row = get_session(session_id)
+        if row is None or row["expires_at"] != expires:
+            return None
+        user = {"email": row["email"], "name": row["name"], "role": row["role"]}
+        self._remember(session_id, user)
+        return user
+
+    def revoke(self, token):
+        session_id, _ = self._parse(token)
+        if session_id is None:
+            return
+        with self._lock:
+            self._cache.pop(session_id, None)
+        _ensure_db()
+        delete_session(session_id)
+
+SESSIONS = SessionStore()
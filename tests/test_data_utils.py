@@ -0,0 +1,26 @@
+import pandas as pd
+
+from data_utils import load_dataset
+
+
+def _csv(tmp_path, rows):
+    path = tmp_path / "upload.csv"
+    pd.DataFrame(rows).to_csv(path, index=False)
+    return path
+
+
+def test_load_dataset_when_later_chunks_change_type(tmp_path):
+    # chunk 1: whole-number prices and text codes; later chunks: fractional prices and numeric-only codes
+    rows = [{"price": 100 + i, "code": f"A{i}"} for i in range(10)]
+    rows += [{"price": 100.5 + i, "code": str(i)} for i in range(10, 30)]
+    df, _ = load_dataset(str(_csv(tmp_path, rows)), cache_dir=str(tmp_path / "cache"), chunksize=10)
+    assert len(df) == 30
+    assert df["price"].tolist()[10] == 110.5
+    assert df["code"].tolist()[:2] == ["A0", "A1"] and df["code"].tolist()[-1] == "29"
+
+
+def test_load_dataset_keeps_distinct_long_ids(tmp_path):
+    # both IDs round to the same float64, and the rows only differ by ID
+    rows = [{"order_id": 2 ** 60 + 1, "amount": 5.0}, {"order_id": 2 ** 60 + 3, "amount": 5.0}]
+    df, _ = load_dataset(str(_csv(tmp_path, rows)), cache_dir=str(tmp_path / "cache"))
+    assert df["order_id"].tolist() == [2 ** 60 + 1, 2 ** 60 + 3]
@@ -0,0 +1,37 @@
+import pandas as pd
+import pytest
+
+from ml_utils import save_model, score_file
+
+
+def _csv(tmp_path, rows):
+    path = tmp_path / "upload.csv"
+    pd.DataFrame(rows).to_csv(path, index=False)
+    return path
+
+
+def test_score_file_parquet_when_later_chunks_change_type(tmp_path):
+    pytest.importorskip("pyarrow")
+    from sklearn.linear_model import LinearRegression
+    rows = [{"x": i, "label": f"A{i}"} for i in range(10)] + [{"x": i + 0.5, "label": str(i)} for i in range(10, 30)]
+    model_path = tmp_path / "model.joblib"
+    save_model(model_path, LinearRegression().fit(pd.DataFrame({"x": [0.0, 1.0]}), [0.0, 2.0]), ["x"],
+               schema={"x": {"kind": "numeric"}, "label": {"kind": "text"}})
+    out = tmp_path / "scored.parquet"
+    assert score_file(str(model_path), str(_csv(tmp_path, rows)), str(out), chunksize=10) == 30
+    scored = pd.read_parquet(out)
+    assert scored["prediction"].tolist()[10] == pytest.approx(21.0)
+    assert scored["label"].tolist()[-1] == "29"
+
+
+def test_score_file_parquet_widens_integer_column(tmp_path):
+    pytest.importorskip("pyarrow")
+    from sklearn.linear_model import LinearRegression
+    rows = [{"x": i} for i in range(10)] + [{"x": i + 0.5} for i in range(10, 30)]
+    model_path = tmp_path / "model.joblib"
+    save_model(model_path, LinearRegression().fit(pd.DataFrame({"x": [0.0, 1.0]}), [0.0, 2.0]), ["x"],
+               schema={"x": {"kind": "numeric", "integer": True}})
+    out = tmp_path / "scored.parquet"
+    assert score_file(str(model_path), str(_csv(tmp_path, rows)), str(out), chunksize=10) == 30
+    assert pd.read_parquet(out)["x"].tolist()[:11] == [*range(10), 10.5]
+    assert not list(tmp_path.glob("*.tmp"))